@@ -0,0 +1,89 @@
+"""
+Rendering a large article in one piece against render_by_blocks() with a
+cold and a warm block cache. Run from the repository root with
+
+    python -m tests.bench_blocks [sections]
+
+The cache is a LocMemCache with room for every block. With the default of
+300 entries, the blocks of a large article do not fit.
+"""
+import os
+import random
+import sys
+import time
+
+SECTION = """## Section {n}
+
+Some *emphasis*, **strong** text, a [link](http://example.com/{n}) and `code`.
+Inline <span class="x">html</span> and &amp; entities -- "smart" quotes.
+
+- item one
+- item two with <b>bold</b>
+
+| a | b |
+|---|---|
+| 1 | 2 |
+
+```python
+# not a heading {n}
+def f(x):
+    return x * {n}
+```
+
+The end of section {n}.
+
+"""
+
+
+def setup():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tests.settings")
+    import django
+    from django.conf import settings
+
+    settings.CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "OPTIONS": {"MAX_ENTRIES": 100000},
+        }
+    }
+    django.setup()
+    from wiki_test import settings as wiki_settings
+
+    wiki_settings.BLOCK_CACHE_MIN_LENGTH = 0
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main(sections):
+    setup()
+    from django.core.cache import cache
+    from wiki.functions.markdown import article_markdown
+    from wiki.functions.markdown.blocks import get_blocks
+    from wiki.functions.markdown.blocks import render_by_blocks
+
+    text = "".join(SECTION.format(n=n) for n in range(sections))
+    print("%d characters, %d blocks" % (len(text), len(get_blocks(text))))
+
+    full, elapsed = timed(lambda: article_markdown(text, None))
+    print("%-28s %8.0f ms" % ("full render", elapsed))
+    cache.clear()
+    blocks, elapsed = timed(lambda: render_by_blocks(text, None))
+    print("%-28s %8.0f ms" % ("blocks, cold cache", elapsed))
+    assert blocks == full, "block render differs from the full render"
+
+    random.seed(1)
+    for _ in range(5):
+        n = random.randrange(sections)
+        text = text.replace(
+            "The end of section %d.\n" % n, "The new end of section %d.\n" % n
+        )
+        _, elapsed = timed(lambda: render_by_blocks(text, None))
+        print("%-28s %8.0f ms" % ("one-section edit", elapsed))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 700)
@@ -0,0 +1,58 @@
+"""
+Cost of a markdown renderer per call against the per-thread pool behind
+article_markdown(). Run from the repository root with
+
+    python -m tests.bench_markdown [iterations]
+
+Building an ArticleMarkdown resolves and instantiates every extension, so
+it is timed on its own, once with extra's extensions listed a second time
+as the extension list used to have them.
+"""
+import os
+import sys
+import time
+
+TEXT = (
+    "# Title\n\n"
+    "Some *text* with a [link](http://example.com) and `code`.\n\n"
+    "```python\nprint(1)\n```\n\n"
+    "| a | b |\n|---|---|\n| 1 | 2 |\n"
+)
+
+
+def setup():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tests.settings")
+    import django
+
+    django.setup()
+
+
+def timed(function, iterations):
+    function()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def main(iterations):
+    setup()
+    from wiki.functions.markdown import EXTRA_EXTENSIONS
+    from wiki.functions.markdown import ArticleMarkdown
+    from wiki.functions.markdown import article_markdown
+
+    class ListedTwice(ArticleMarkdown):
+        def get_markdown_extensions(self):
+            return super().get_markdown_extensions() + sorted(EXTRA_EXTENSIONS)
+
+    for name, function in [
+        ("construct, extra listed twice", lambda: ListedTwice(None)),
+        ("construct", lambda: ArticleMarkdown(None)),
+        ("new renderer per call", lambda: ArticleMarkdown(None).convert(TEXT)),
+        ("article_markdown (pool)", lambda: article_markdown(TEXT, None)),
+    ]:
+        print("%-30s %8.2f ms" % (name, timed(function, iterations)))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 300)
@@ -0,0 +1,139 @@
+"""
+Deleting an article whose path has many children, which moves them to
+lost-and-found. Run from the repository root with
+
+    python -m tests.bench_orphans [children]
+
+Article.delete() moves all children in one tree update. For comparison
+the same number of children is then moved with one MPTT move_to() each,
+as the delete handler used to do. The tree has another sibling with twice
+as many children behind the deleted path, which every move shifts.
+"""
+import os
+import sys
+import time
+
+
+def setup():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tests.settings")
+    import django
+
+    django.setup()
+    from django.core.management import call_command
+
+    call_command("migrate", verbosity=0)
+    from wiki_test import settings as wiki_settings
+
+    # Rendering in the background would compete for the database
+    wiki_settings.PRERENDER = False
+
+
+def add_children(parent, count, prefix):
+    """Adds count leaf children behind parent's last child, in bulk."""
+    from django.contrib.contenttypes.models import ContentType
+    from django.db.models import F
+    from wiki.models import Article
+    from wiki.models import ArticleForObject
+    from wiki.models import ArticleRevision
+    from wiki.models import URLPath
+
+    parent.refresh_from_db()
+    articles = Article.objects.bulk_create([Article() for _ in range(count)])
+    revisions = ArticleRevision.objects.bulk_create(
+        [
+            ArticleRevision(article=article, title="Bench", revision_number=1)
+            for article in articles
+        ]
+    )
+    for article, revision in zip(articles, revisions):
+        article.current_revision = revision
+    Article.objects.bulk_update(articles, ["current_revision"])
+    URLPath.objects.filter(tree_id=parent.tree_id, rght__gte=parent.rght).update(
+        rght=F("rght") + 2 * count
+    )
+    URLPath.objects.filter(tree_id=parent.tree_id, lft__gt=parent.rght).update(
+        lft=F("lft") + 2 * count
+    )
+    urlpaths = URLPath.objects.bulk_create(
+        [
+            URLPath(
+                site_id=parent.site_id,
+                parent_id=parent.id,
+                slug="%s%d" % (prefix, i),
+                article=article,
+                tree_id=parent.tree_id,
+                level=parent.level + 1,
+                lft=parent.rght + 2 * i,
+                rght=parent.rght + 2 * i + 1,
+                path_key="%s/%s%d" % (parent.path_key, prefix, i),
+            )
+            for i, article in enumerate(articles)
+        ]
+    )
+    URLPath.objects.filter(id=parent.id).update(child_count=F("child_count") + count)
+    content_type = ContentType.objects.get_for_model(URLPath)
+    ArticleForObject.objects.bulk_create(
+        [
+            ArticleForObject(
+                article=article,
+                content_type=content_type,
+                object_id=urlpath.id,
+                is_mptt=True,
+            )
+            for article, urlpath in zip(articles, urlpaths)
+        ]
+    )
+
+
+def timed(function):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    start = time.perf_counter()
+    with CaptureQueriesContext(connection) as queries:
+        function()
+    return (time.perf_counter() - start) * 1000, len(queries)
+
+
+def main(count):
+    setup()
+    from django.contrib.sites.models import Site
+    from wiki.models import Article
+    from wiki.models import URLPath
+    from wiki.models.urlpath import get_lost_and_found
+
+    root = URLPath.create_root(title="Root")
+    lost_and_found = get_lost_and_found(Site.objects.get_current())
+    parent = URLPath.create_urlpath(root, "parent", title="Parent")
+    add_children(parent, count, "c")
+    after = URLPath.create_urlpath(root, "zafter", title="After")
+    add_children(after, 2 * count, "a")
+    print("%d paths" % URLPath.objects.count())
+
+    article = Article.objects.get(id=parent.article_id)
+    elapsed, queries = timed(article.delete)
+    print(
+        "%-24s %8.0f ms, %5d queries, %d in lost-and-found"
+        % (
+            "Article.delete()",
+            elapsed,
+            queries,
+            URLPath.objects.filter(parent=lost_and_found).count(),
+        )
+    )
+
+    parent = URLPath.create_urlpath(root, "parent", title="Parent")
+    add_children(parent, count, "m")
+    parent.refresh_from_db()
+    lost_and_found.refresh_from_db()
+
+    def move_each():
+        for child in parent.get_children():
+            child.move_to(lost_and_found)
+
+    elapsed, queries = timed(move_each)
+    print("%-24s %8.0f ms, %5d queries" % ("move_to() per child", elapsed, queries))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,178 @@
+"""
+The can_read() and can_write() filters against the group membership join
+they replaced, on a generated dataset. Run from the repository root with
+
+    python -m tests.bench_permissions [articles]
+
+The dataset has 50 groups and 1000 users in 3 groups each. Every article
+belongs to a random group and owner and has a path under one parent.
+Times are the best of 5 runs.
+"""
+import os
+import random
+import sys
+import time
+
+
+def setup():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tests.settings")
+    import django
+
+    django.setup()
+    from django.core.management import call_command
+
+    call_command("migrate", verbosity=0)
+    from wiki_test import settings as wiki_settings
+
+    # Rendering in the background would compete for the database
+    wiki_settings.PRERENDER = False
+
+
+def build(count):
+    from django.contrib.auth.models import Group
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from wiki.models import Article
+    from wiki.models import ArticleGrant
+    from wiki.models import ArticleRevision
+    from wiki.models import URLPath
+
+    random.seed(1)
+    groups = Group.objects.bulk_create([Group(name="g%d" % i) for i in range(50)])
+    users = User.objects.bulk_create([User(username="u%d" % i) for i in range(1000)])
+    Membership = User.groups.through
+    Membership.objects.bulk_create(
+        [
+            Membership(user_id=user.id, group_id=group.id)
+            for user in users
+            for group in random.sample(groups, 3)
+        ]
+    )
+    articles = Article.objects.bulk_create(
+        [
+            Article(
+                other_read=random.random() < 0.3,
+                other_write=False,
+                group_id=random.choice(groups).id,
+                group_read=random.random() < 0.7,
+                group_write=random.random() < 0.2,
+                owner_id=random.choice(users).id,
+            )
+            for _ in range(count)
+        ],
+        batch_size=2000,
+    )
+    ArticleRevision.objects.bulk_create(
+        [
+            ArticleRevision(article=article, title="t%05d" % i, revision_number=1)
+            for i, article in enumerate(articles)
+        ],
+        batch_size=2000,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "UPDATE wiki_article SET current_revision_id = (SELECT r.id FROM "
+            "wiki_articlerevision r WHERE r.article_id = wiki_article.id) "
+            "WHERE current_revision_id IS NULL"
+        )
+    root = URLPath.create_root(title="Root")
+    parent = URLPath.create_urlpath(root, "parent", title="Parent")
+    # Only their parent matters here, not their place in the tree
+    URLPath.objects.bulk_create(
+        [
+            URLPath(
+                article=article,
+                parent=parent,
+                slug="s%05d" % i,
+                site_id=parent.site_id,
+                tree_id=parent.tree_id,
+                level=parent.level + 1,
+                lft=0,
+                rght=0,
+            )
+            for i, article in enumerate(articles)
+        ],
+        batch_size=2000,
+    )
+    ArticleGrant.rebuild(Article.objects.values_list("id", flat=True))
+    return User.objects.get(username="u7"), parent
+
+
+def join_filter(queryset, user, access, prefix=""):
+    """The membership join can_read() and can_write() used to filter with."""
+    from django.db.models import Count
+    from django.db.models import Q
+
+    return queryset.filter(
+        Q(**{prefix + "other_" + access: True})
+        | Q(**{prefix + "owner": user})
+        | (
+            Q(**{prefix + "group__user": user})
+            & Q(**{prefix + "group_" + access: True})
+        )
+    ).annotate(Count("id"))
+
+
+def best(function, runs=5):
+    function()
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main(count):
+    setup()
+    from wiki.models import Article
+    from wiki.models import URLPath
+
+    user, parent = build(count)
+    articles = Article.objects.active().order_by("current_revision__title")
+    urlpaths = URLPath.objects.filter(parent=parent).active()
+    urlpaths = urlpaths.order_by("article__current_revision__title")
+    cases = [
+        (
+            "Article can_read, page 25",
+            lambda: list(join_filter(articles, user, "read")[:25]),
+            lambda: list(articles.can_read(user)[:25]),
+        ),
+        (
+            "Article can_read, count",
+            lambda: join_filter(articles, user, "read").count(),
+            lambda: articles.can_read(user).count(),
+        ),
+        (
+            "Article can_write, count",
+            lambda: join_filter(articles, user, "write").count(),
+            lambda: articles.can_write(user).count(),
+        ),
+        (
+            "URLPath can_read, page 30",
+            lambda: list(join_filter(urlpaths, user, "read", "article__")[:30]),
+            lambda: list(urlpaths.can_read(user)[:30]),
+        ),
+        (
+            "URLPath can_read, count",
+            lambda: join_filter(urlpaths, user, "read", "article__").count(),
+            lambda: urlpaths.can_read(user).count(),
+        ),
+    ]
+    for access in "read", "write":
+        join = join_filter(Article.objects.all(), user, access)
+        grants = getattr(Article.objects, "can_" + access)(user)
+        assert set(join.values_list("id", flat=True)) == set(
+            grants.values_list("id", flat=True)
+        ), "the filters disagree on can_" + access
+    print("%-28s %12s %12s" % ("", "join", "grants"))
+    for name, join, grants in cases:
+        print("%-28s %9.1f ms %9.1f ms" % (name, best(join), best(grants)))
+    print(
+        "%d of %d articles readable by %s"
+        % (articles.can_read(user).count(), count, user.username)
+    )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,124 @@
+"""
+Edits per second under concurrent writers: revision numbers from
+ArticleRevisionCounter against MAX(revision_number) + 1. Run from the
+repository root with
+
+    python -m tests.bench_revisions [writers ...]
+
+It migrates a throwaway sqlite file, in-memory databases are not shared
+between threads. The two numbering strategies are timed on their own, with
+the revision and article writes of add_revision() but without its signals,
+and add_revision() itself is timed as a whole.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+EDITS = 200
+
+
+def setup():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tests.settings")
+    import django
+    from django.conf import settings
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+    settings.DATABASES["default"].update(NAME=path, OPTIONS={"timeout": 30})
+    django.setup()
+    from django.core.management import call_command
+
+    call_command("migrate", verbosity=0)
+    from wiki_test import settings as wiki_settings
+
+    # Rendering in the background would compete for the database
+    wiki_settings.PRERENDER = False
+
+
+def number_from_max(article):
+    from django.db.models import Max
+    from wiki.models import ArticleRevision
+
+    latest = ArticleRevision.objects.filter(article=article).aggregate(
+        latest=Max("revision_number")
+    )["latest"]
+    return (latest or 0) + 1
+
+
+def number_from_counter(article):
+    return article.next_revision_number()
+
+
+def commit(article, number):
+    from django.db import transaction
+    from wiki.models import Article
+    from wiki.models import ArticleRevision
+
+    with transaction.atomic():
+        revision = ArticleRevision(
+            article=article, revision_number=number(article), title="Bench"
+        )
+        # Without signals, so that only the numbering differs
+        ArticleRevision.objects.bulk_create([revision])
+        Article.objects.filter(id=article.id).update(current_revision=revision)
+
+
+def add_revision(article, number):
+    from wiki.models import ArticleRevision
+
+    revision = ArticleRevision()
+    revision.inherit_predecessor(article)
+    article.add_revision(revision)
+
+
+def run(edit, writers, number=None):
+    from django.db import DatabaseError
+    from django.db import connection
+    from wiki.models import Article
+    from wiki.models import URLPath
+
+    article = URLPath.create_urlpath(
+        URLPath.root(), "bench-%d-%d" % (writers, time.monotonic_ns()), title="Bench"
+    ).article
+    done = []
+    failed = []
+    barrier = threading.Barrier(writers)
+
+    def writer():
+        barrier.wait()
+        for _ in range(EDITS // writers):
+            try:
+                edit(Article.objects.get(id=article.id), number)
+                done.append(1)
+            except DatabaseError:
+                failed.append(1)
+        connection.close()
+
+    threads = [threading.Thread(target=writer) for _ in range(writers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(done) / (time.perf_counter() - start), len(failed)
+
+
+def main(writer_counts):
+    setup()
+    from wiki.models import URLPath
+
+    URLPath.create_root(title="Root")
+    print("%-14s %7s %12s %8s" % ("", "writers", "edits/s", "failed"))
+    for writers in writer_counts:
+        for name, edit, number in [
+            ("MAX() + 1", commit, number_from_max),
+            ("counter", commit, number_from_counter),
+            ("add_revision", add_revision, None),
+        ]:
+            rate, failed = run(edit, writers, number)
+            print("%-14s %7d %12.0f %8d" % (name, writers, rate, failed))
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1, 4, 8])
@@ -0,0 +1,150 @@
+"""
+Path resolution through the in-memory tree snapshot against the path_key
+lookup, on a generated tree. Run from the repository root with
+
+    python -m tests.bench_tree [parents] [children per parent]
+
+The default builds 100 parents with 999 children each, 100,000 paths in
+all, which takes a while.
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+
+def setup():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tests.settings")
+    import django
+
+    django.setup()
+    from django.core.management import call_command
+
+    call_command("migrate", verbosity=0)
+    from wiki_test import settings as wiki_settings
+
+    # Rendering in the background would compete for the database
+    wiki_settings.PRERENDER = False
+
+
+def build(parents, children):
+    from django.db import connection
+    from django.db import transaction
+    from wiki.models import Article
+    from wiki.models import ArticleRevision
+    from wiki.models import URLPath
+
+    root = URLPath.create_root(title="Root")
+    with transaction.atomic():
+        articles = Article.objects.bulk_create(
+            [Article() for _ in range(parents * (children + 1))], batch_size=2000
+        )
+        ArticleRevision.objects.bulk_create(
+            [
+                ArticleRevision(article=article, title="Bench", revision_number=1)
+                for article in articles
+            ],
+            batch_size=2000,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE wiki_article SET current_revision_id = (SELECT r.id FROM "
+                "wiki_articlerevision r WHERE r.article_id = wiki_article.id) "
+                "WHERE current_revision_id IS NULL"
+            )
+        articles = iter(articles)
+        lft = root.rght + 1
+        urlpaths = []
+        for i in range(parents):
+            parent = URLPath.objects.create(
+                site_id=root.site_id,
+                parent_id=root.id,
+                slug="s%d" % i,
+                article=next(articles),
+                tree_id=root.tree_id,
+                level=1,
+                lft=lft,
+                rght=lft + 2 * children + 1,
+                path_key="s%d" % i,
+                child_count=children,
+            )
+            lft += 1
+            for j in range(children):
+                urlpaths.append(
+                    URLPath(
+                        site_id=root.site_id,
+                        parent_id=parent.id,
+                        slug="p%d" % j,
+                        article=next(articles),
+                        tree_id=root.tree_id,
+                        level=2,
+                        lft=lft,
+                        rght=lft + 1,
+                        path_key="s%d/p%d" % (i, j),
+                    )
+                )
+                lft += 2
+            lft += 1
+        URLPath.objects.bulk_create(urlpaths, batch_size=2000)
+        URLPath.objects.filter(id=root.id).update(rght=lft)
+        URLPath.objects.filter(id=root.id).update(child_count=parents)
+
+
+def timed(function, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+
+def main(parents, children):
+    setup()
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from wiki.functions import tree
+    from wiki.models import URLPath
+    from wiki_test import settings
+
+    build(parents, children)
+
+    tree._snapshots.clear()
+    tracemalloc.start()
+    snapshot, elapsed = timed(tree.get_snapshot)
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(
+        "%-32s %8.0f ms, %.1f MB retained"
+        % ("full load, %d paths" % len(snapshot.positions), elapsed, retained / 1e6)
+    )
+    path = "s%d/p%d/" % (parents // 2, children // 2)
+    _, elapsed = timed(lambda: snapshot.resolve(path), 1000)
+    print("%-32s %8.3f ms" % ("resolve", elapsed))
+    _, elapsed = timed(tree.get_snapshot, 100)
+    print("%-32s %8.3f ms" % ("up-to-date check", elapsed))
+
+    urlpath = URLPath.objects.get(path_key="s1/p1")
+    urlpath.slug = "renamed"
+    urlpath.save()
+    _, elapsed = timed(tree.get_snapshot)
+    print("%-32s %8.2f ms" % ("refresh after 1 rename", elapsed))
+    target = URLPath.objects.get(path_key="s3")
+    for j in range(20):
+        urlpath = URLPath.objects.get(path_key="s2/p%d" % j)
+        urlpath.slug = "moved%d" % j
+        urlpath.move_to(target)
+    _, elapsed = timed(tree.get_snapshot)
+    print("%-32s %8.2f ms" % ("refresh after 20 moves", elapsed))
+
+    for name, enabled in [
+        ("get_by_path, snapshot", True),
+        ("get_by_path, path_key", False),
+    ]:
+        settings.TREE_SNAPSHOT = enabled
+        with CaptureQueriesContext(connection) as queries:
+            _, elapsed = timed(lambda: URLPath.get_by_path(path))
+        print("%-32s %8.2f ms, %d queries" % (name, elapsed, len(queries)))
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:3]]
+    main(*(counts + [100, 999][len(counts):]))
@@ -0,0 +1,10 @@
+"""
+Settings for the test suite, run from the repository root with
+
+    python manage.py test tests --settings=tests.settings
+"""
+from wiki_test.settings import *  # noqa
+
+DATABASES = {"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}}
+
+PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
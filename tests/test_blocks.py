@@ -0,0 +1,41 @@
+from django.core.cache import cache
+from django.test import TestCase
+from wiki.functions.markdown import article_markdown
+from wiki.functions.markdown.blocks import get_blocks
+from wiki.functions.markdown.blocks import render_blocks
+
+SECTION = "Some *text* in a paragraph.\n\n"
+
+CASES = [
+    # A heading straight after a table row is another row
+    "| a | b |\n|---|---|\n| 1 | 2 |\n# Heading\n\n" + SECTION,
+    # A heading after an indented continuation stays in the list item
+    "* item\n\n    continuation\n# Heading\n\n" + SECTION,
+    "* item\n\n    continuation\n\n# Heading\n\n" + SECTION,
+    # An indented fence inside a list is not fenced code
+    "* item\n\n    ```\n    code\n    ```\n\n# Heading\n\n" + SECTION,
+    "* item\n\n    ```\n# Heading\n    ```\n\n" + SECTION,
+    "> quote\n# Heading\n\n" + SECTION,
+    "    indented code\n\n# Heading\n\n" + SECTION,
+    "```\n# Not a heading\n```\n\n# Heading\n\n" + SECTION,
+    "\n# First\n\n" + SECTION + "# Second\n\n" + SECTION + "## Third\n\n" + SECTION,
+]
+
+
+class RenderBlocksTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_blocks_render_like_the_whole_text(self):
+        for text in CASES:
+            with self.subTest(text=text):
+                # Markdown puts a newline between top-level elements
+                self.assertEqual(
+                    "\n".join(render_blocks(get_blocks(text), None)),
+                    article_markdown(text, None),
+                )
+
+    def test_splits_at_headings_after_paragraphs(self):
+        text = CASES[-1]
+        self.assertEqual(len(get_blocks(text)), 3)
+        self.assertEqual("".join(get_blocks(text)), text)
@@ -0,0 +1,96 @@
+from unittest import skipUnless
+
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.auth.models import Group
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from wiki.models import Article
+from wiki.models import URLPath
+
+
+class PermissionQueryTest(TestCase):
+    def setUp(self):
+        self.group = Group.objects.create(name="editors")
+        self.member = User.objects.create_user("member", "m@b.c", "pw")
+        self.member.groups.add(self.group)
+        self.outsider = User.objects.create_user("outsider", "o@b.c", "pw")
+        root = URLPath.create_root(title="Root", content="root")
+        self.private = URLPath.create_urlpath(
+            root,
+            "private",
+            title="Private",
+            article_kwargs={
+                "group": self.group,
+                "group_read": True,
+                "group_write": True,
+                "other_read": False,
+                "other_write": False,
+            },
+        )
+
+    def test_no_group_membership_join(self):
+        membership_table = User.groups.through._meta.db_table
+        querysets = [
+            Article.objects.can_read(self.member),
+            Article.objects.can_write(self.member),
+            URLPath.objects.can_read(self.member),
+            URLPath.objects.can_write(self.member),
+        ]
+        for queryset in querysets:
+            with self.subTest(query=str(queryset.query)):
+                self.assertNotIn(membership_table, str(queryset.query))
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    @skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN is sqlite's")
+    def test_query_plan(self):
+        for user in self.member, self.outsider, AnonymousUser():
+            querysets = [
+                Article.objects.can_read(user),
+                Article.objects.can_write(user),
+                URLPath.objects.can_read(user).filter(parent=self.private.parent),
+                URLPath.objects.can_write(user),
+            ]
+            for queryset in querysets:
+                # Without ordering, so that only the filter is planned
+                plan = self.explain(queryset.order_by())
+                with self.subTest(user=str(user), plan=plan):
+                    grants = [step for step in plan if " U0 " in step]
+                    self.assertTrue(grants)
+                    for step in grants:
+                        self.assertIn("USING INDEX wiki_articlegrant_principal", step)
+                    self.assertIn("LIST SUBQUERY 1", plan)
+                    for step in plan:
+                        self.assertNotIn("GROUP BY", step)
+                        self.assertNotIn("TEMP B-TREE", step)
+                        self.assertFalse(step.startswith("SCAN"), step)
+
+    def test_group_access(self):
+        article = self.private.article
+        self.assertIn(article, Article.objects.can_read(self.member))
+        self.assertIn(article, Article.objects.can_write(self.member))
+        self.assertNotIn(article, Article.objects.can_read(self.outsider))
+        self.assertIn(self.private, URLPath.objects.can_read(self.member))
+        self.assertNotIn(self.private, URLPath.objects.can_read(self.outsider))
+
+    def test_partial_save_writes_grants_of_the_saved_row(self):
+        article = Article.objects.get(id=self.private.article.id)
+        article.other_read = True
+        article.save(update_fields=["modified"])
+        self.assertNotIn(article, Article.objects.can_read(self.outsider))
+
+        article.group_read = False
+        article.save(update_fields=["other_read"])
+        # Only other_read was written
+        self.assertIn(article, Article.objects.can_read(self.outsider))
+        self.assertIn(article, Article.objects.can_read(self.member))
+        article.save(update_fields=["group_read"])
+        self.assertIn(article, Article.objects.can_read(self.member))
+        article.other_read = False
+        article.save(update_fields=["other_read"])
+        self.assertNotIn(article, Article.objects.can_read(self.member))
@@ -0,0 +1,30 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from wiki.models import URLPath
+from wiki_test import settings
+
+
+class PrerenderCommandTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.article = URLPath.create_root(title="Root", content="root").article
+
+    def test_refuses_to_run_without_render_store(self):
+        with mock.patch.object(settings, "RENDER_STORE", False):
+            with self.assertRaises(CommandError):
+                call_command("wiki_prerender")
+
+    def test_fills_in_missing_plain_text(self):
+        self.article.get_cached_content()
+        revision = self.article.current_revision
+        revision.renders.get()
+        type(revision).objects.filter(id=revision.id).update(plain_text=None)
+        call_command("wiki_prerender", stdout=StringIO())
+        revision.refresh_from_db()
+        self.assertEqual(revision.plain_text, "root")
+        self.assertEqual(revision.renders.count(), 1)
@@ -0,0 +1,64 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from wiki.models import URLPath
+from wiki_test import settings
+
+TEXT = "# One\n\nFirst section.\n\n# Two\n\nSecond section.\n"
+
+
+class PreviewBlocksTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        root = URLPath.create_root(title="Root", content="root")
+        self.urlpath = URLPath.create_urlpath(root, "a", title="A", content="a")
+        self.user = User.objects.create_user("editor", "e@b.c", "pw")
+        self.article = self.urlpath.article
+        self.article.owner = self.user
+        self.article.other_write = False
+        self.article.save()
+
+    def post(self, **data):
+        return self.client.post("/a/_preview/blocks/", data)
+
+    def test_needs_write_access(self):
+        response = self.post(text=TEXT, version=1)
+        self.assertNotEqual(response.status_code, 200)
+        self.client.force_login(User.objects.create_user("reader", "r@b.c", "pw"))
+        self.assertEqual(self.post(text=TEXT, version=1).status_code, 403)
+
+    def test_limits(self):
+        self.client.force_login(self.user)
+        with mock.patch.object(settings, "PREVIEW_MAX_LENGTH", 20):
+            self.assertEqual(self.post(text=TEXT, version=1).status_code, 413)
+        with mock.patch.object(settings, "PREVIEW_MAX_BLOCKS", 1):
+            self.assertEqual(self.post(text=TEXT, version=1).status_code, 413)
+        response = self.post(text=TEXT, version=1, editor="a b")
+        self.assertEqual(response.status_code, 400)
+
+    def test_editors_and_debounce(self):
+        self.client.force_login(self.user)
+        with mock.patch.object(settings, "PREVIEW_DEBOUNCE", 0):
+            response = self.post(text=TEXT, version=5, editor="tab1")
+            self.assertEqual(len(response.json()["blocks"]), 2)
+            # Another tab counts its own versions
+            response = self.post(text=TEXT, version=1, editor="tab2")
+            self.assertEqual(response.status_code, 200)
+            response = self.post(text=TEXT, version=4, editor="tab1")
+            self.assertEqual(response.status_code, 409)
+            text = TEXT + "More.\n"
+            response = self.post(text=text, version=6, base=5, editor="tab1")
+            self.assertEqual(len(response.json()["blocks"]), 1)
+        # The debounce holds for the user, whatever the editor id
+        response = self.post(text=TEXT, version=7, editor="tab1")
+        self.assertEqual(response.status_code, 200)
+        response = self.post(text=TEXT, version=1, editor="tab3")
+        self.assertEqual(response.status_code, 429)
+
+    def test_blocks_expire_early(self):
+        self.client.force_login(self.user)
+        with mock.patch.object(cache, "set_many") as set_many:
+            self.post(text=TEXT, version=1)
+        self.assertEqual(set_many.call_args[0][1], settings.PREVIEW_CACHE_TIMEOUT)
@@ -0,0 +1,127 @@
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from wiki.models import Article
+from wiki.models import RenderedRevision
+from wiki.models import URLPath
+
+
+class SingleFlightRenderTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.article = URLPath.create_root(title="Root", content="root body").article
+
+    def test_concurrent_readers_render_once(self):
+        renders = []
+
+        def render(article, *args, **kwargs):
+            renders.append(threading.get_ident())
+            time.sleep(0.2)
+            return "<p>rendered</p>"
+
+        readers = 8
+        barrier = threading.Barrier(readers)
+        key = self.article.get_cache_content_key()
+        results = []
+
+        def read():
+            barrier.wait()
+            results.append(self.article._render_single_flight(key, None))
+
+        with mock.patch.object(Article, "render", render), mock.patch.object(
+            RenderedRevision, "store_html"
+        ):
+            threads = [threading.Thread(target=read) for _ in range(readers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(renders), 1)
+        self.assertEqual(results, ["<p>rendered</p>"] * readers)
+
+    def test_stale_content_is_served_while_rendering(self):
+        cache.set(self.article.get_cache_stale_key(), "<p>stale</p>", None)
+        started = threading.Event()
+        finish = threading.Event()
+
+        def render(article, *args, **kwargs):
+            started.set()
+            finish.wait(5)
+            return "<p>new</p>"
+
+        key = self.article.get_cache_content_key()
+        with mock.patch.object(Article, "render", render), mock.patch.object(
+            RenderedRevision, "store_html"
+        ):
+            renderer = threading.Thread(
+                target=self.article._render_single_flight, args=(key, None)
+            )
+            renderer.start()
+            started.wait(5)
+            try:
+                # The renderer holds the lock
+                self.assertEqual(self.article.get_cached_content(), "<p>stale</p>")
+            finally:
+                finish.set()
+                renderer.join()
+        self.assertEqual(self.article.get_cached_content(), "<p>new</p>")
+
+
+class RenderStoreTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.article = URLPath.create_root(title="Root", content="root body").article
+
+    def test_clear_cache_deletes_stored_renders(self):
+        self.article.get_cached_content()
+        renders = RenderedRevision.objects.filter(revision__article=self.article)
+        self.assertEqual(renders.count(), 1)
+        self.article.clear_cache()
+        self.assertEqual(renders.count(), 0)
+        with mock.patch.object(Article, "render", return_value="<p>new</p>"):
+            self.assertEqual(self.article.get_cached_content(), "<p>new</p>")
+
+    def test_render_outdated_by_a_clear_is_not_stored(self):
+        def render(article, *args, **kwargs):
+            article.clear_cache()
+            return "<p>old</p>"
+
+        with mock.patch.object(Article, "render", render):
+            self.article.get_cached_content()
+        self.assertFalse(
+            RenderedRevision.objects.filter(revision__article=self.article).exists()
+        )
+
+
+class UserDependentCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.article = URLPath.create_root(title="Root", content="root body").article
+        self.users = [
+            User.objects.create_user(name, name + "@b.c", "pw") for name in "ab"
+        ]
+
+    def count_renders(self):
+        renders = []
+
+        def render(article, *args, **kwargs):
+            renders.append(kwargs.get("user"))
+            return "<p>rendered</p>"
+
+        with mock.patch.object(Article, "render", render):
+            for user in self.users * 2:
+                self.article.get_cached_content(user)
+        return renders
+
+    def test_users_share_one_copy(self):
+        self.assertEqual(self.count_renders(), [None])
+
+    def test_user_dependent_extensions_render_the_whole_article_per_user(self):
+        with mock.patch("wiki.models.article.is_user_dependent", return_value=True):
+            self.assertEqual(self.count_renders(), self.users)
+        self.assertFalse(RenderedRevision.objects.exists())
@@ -0,0 +1,29 @@
+from django.test import TestCase
+from wiki.models import Article
+from wiki.models import ArticleRevision
+from wiki.models import ArticleRevisionCounter
+from wiki.models import URLPath
+
+
+class RevisionNumberTest(TestCase):
+    def setUp(self):
+        self.article = URLPath.create_root(title="Root", content="root").article
+
+    def add_revision(self, article):
+        revision = ArticleRevision()
+        revision.inherit_predecessor(article)
+        article.add_revision(revision)
+        return revision.revision_number
+
+    def test_saving_an_old_instance_keeps_the_counter(self):
+        stale = Article.objects.get(id=self.article.id)
+        self.assertEqual(self.add_revision(self.article), 2)
+        stale.other_write = False
+        stale.save()
+        article = Article.objects.get(id=self.article.id)
+        self.assertEqual(self.add_revision(article), 3)
+
+    def test_counter_is_created_with_the_first_revision(self):
+        self.assertEqual(self.article.revision_counter.value, 1)
+        ArticleRevisionCounter.objects.filter(article=self.article).delete()
+        self.assertEqual(self.article.next_revision_number(), 1)
@@ -0,0 +1,61 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from wiki.functions import tree
+from wiki.models import URLPath
+
+
+class AncestorQueriesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        parent = URLPath.create_root(title="Root", content="root")
+        self.paths = []
+        for depth in range(5):
+            parent = URLPath.create_urlpath(
+                parent, "p%d" % depth, title="P%d" % depth, content="body"
+            )
+            self.paths.append(parent)
+        for parent in self.paths[1], self.paths[4]:
+            for child in range(5):
+                URLPath.create_urlpath(
+                    parent, "c%d" % child, title="C%d" % child, content="child"
+                )
+        self.client.force_login(User.objects.create_superuser("admin", "a@b.c", "pw"))
+
+    def get(self, urlpath):
+        response = self.client.get("/" + urlpath.path)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_page_queries(self):
+        for urlpath in self.paths:
+            # Fills the caches shared by all pages, like the tree snapshot
+            self.get(urlpath)
+        # Session, user, the path with its ancestors, the article's relation
+        # and path, its children and their articles and revisions. The
+        # breadcrumbs do not add a query per ancestor.
+        for urlpath in self.paths[1], self.paths[4]:
+            with self.subTest(level=urlpath.level):
+                with self.assertNumQueries(8):
+                    self.get(urlpath)
+
+
+class TreeSnapshotTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        tree._snapshots.clear()
+        root = URLPath.create_root(title="Root", content="root")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.urlpath = URLPath.create_urlpath(root, "a", title="A", content="a")
+
+    def test_changes_leave_the_shared_snapshot_alone(self):
+        old = tree.get_snapshot()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.urlpath.slug = "b"
+            self.urlpath.save()
+        new = tree.get_snapshot()
+        self.assertIsNot(new, old)
+        self.assertEqual(old.resolve("a/"), self.urlpath.id)
+        self.assertIsNone(new.resolve("a/"))
+        self.assertEqual(new.resolve("b/"), self.urlpath.id)
+        self.assertIs(tree.get_snapshot(), new)
@@ -90,6 +90,17 @@ def get_article(  # noqa: max-complexity 19
         except models.Article.DoesNotExist:
             raise Http404("Article id {:} not found".format(article_id))
         except models.URLPath.DoesNotExist:
+            target = models.URLPathRedirect.get_target(path)
+            if target is not None:
+                # Without read access the new location is not revealed
+                if not target.article.can_read(request.user):
+                    return response_forbidden(
+                        request, target.article, None, read_denied=True
+                    )
+                match = request.resolver_match
+                url = reverse(match.view_name, kwargs=dict(match.kwargs, path=target.path))
+                query = request.META.get("QUERY_STRING", "")
+                return HttpResponseRedirect(url + ("?" + query if query else ""))
             try:
                 pathlist = list(
                     filter(
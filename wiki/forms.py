@@ -15,6 +15,7 @@ from django.utils.translation import gettext, gettext_lazy as _, pgettext_lazy
 from wiki import models
 from wiki_test import settings
 from wiki.functions import permissions
+from wiki.functions import propagate
 from wiki.functions.diff import simple_merge
 from wiki.functions.base import PluginSettingsFormMixin
 from wiki.functions.markdown.editors  import getEditor
@@ -132,7 +133,7 @@ class SpamProtectionMixin:
 
         if not settings.LOG_IPS_ANONYMOUS:
             return
-        if request.user.has_perm("wiki.moderator"):
+        if permissions.get_context(request.user).can_moderate:
             return
 
         from_time = timezone.now() - timedelta(
@@ -442,7 +443,13 @@ class PermissionsForm(PluginSettingsFormMixin, forms.ModelForm):
         required=False,
     )
 
+    propagating = False
+
     def get_usermessage(self):
+        if self.propagating:
+            return _(
+                "已更新项目的权限设置。下级文章较多，正在后台应用。"
+            )
         if self.changed_data:
             return _("已更新项目的权限设置。")
         else:
@@ -529,12 +536,26 @@ class PermissionsForm(PluginSettingsFormMixin, forms.ModelForm):
             article.group_write = self.article.group_write
 
         if self.can_assign:
-            if self.cleaned_data["recursive"]:
-                article.set_permissions_recursive()
-            if self.cleaned_data["recursive_owner"]:
-                article.set_owner_recursive()
-            if self.cleaned_data["recursive_group"]:
-                article.set_group_recursive()
+            kinds = [
+                kind
+                for kind, field in (
+                    ("permissions", "recursive"),
+                    ("owner", "recursive_owner"),
+                    ("group", "recursive_group"),
+                )
+                if self.cleaned_data[field]
+            ]
+            if kinds:
+                values = propagate.get_values(article, kinds)
+                if (
+                    settings.PROPAGATE_BACKGROUND_MIN is not None
+                    and propagate.count_descendants(article)
+                    > settings.PROPAGATE_BACKGROUND_MIN
+                ):
+                    propagate.enqueue(article, values)
+                    self.propagating = True
+                else:
+                    propagate.propagate(article, values)
             if self.cleaned_data["locked"] and not article.current_revision.locked:
                 revision = models.ArticleRevision()
                 revision.inherit_predecessor(self.article)
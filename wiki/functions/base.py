@@ -30,6 +30,9 @@ class BasePlugin:
     #          'get_article': lambda obj: obj.attachment.article}
     #            ]
 
+    # Markdown extensions whose output depends on the user viewing the
+    # article must set ``user_dependent = True`` on the extension instance,
+    # otherwise one rendered copy is shared by all users.
     markdown_extensions = []
 
     class RenderMedia:
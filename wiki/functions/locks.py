@@ -0,0 +1,55 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache import DEFAULT_CACHE_ALIAS
+from django.core.cache import cache
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+_local_locks = {}
+_local_locks_lock = threading.Lock()
+
+
+def _uses_local_cache():
+    # A LocMem cache is private to the process, so a plain lock is cheaper
+    # and just as correct.
+    return isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache)
+
+
+@contextmanager
+def single_flight(key, timeout):
+    """
+    Yields True to exactly one caller per key at a time, the one that should
+    do the work, and False to everybody else. The lock expires after timeout
+    seconds in case its holder dies.
+    """
+    if _uses_local_cache():
+        with _local_locks_lock:
+            lock = _local_locks.setdefault(key, threading.Lock())
+        acquired = lock.acquire(blocking=False)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                with _local_locks_lock:
+                    _local_locks.pop(key, None)
+                lock.release()
+    else:
+        lock_key = "{key}-lock".format(key=key)
+        acquired = cache.add(lock_key, 1, timeout)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                cache.delete(lock_key)
+
+
+def wait_for(key, timeout, interval=0.05):
+    """Polls the cache until key is set or timeout seconds have passed."""
+    deadline = time.monotonic() + timeout
+    while True:
+        value = cache.get(key)
+        if value is not None or time.monotonic() >= deadline:
+            return value
+        time.sleep(interval)
@@ -1,8 +1,19 @@
+import hashlib
+import threading
+from contextlib import contextmanager
+
 import bleach
 import markdown
+from markdown.extensions import extra
 
 from wiki_test import settings
 from wiki.functions import registry
+from wiki.functions.markdown import highlight  # noqa: F401 (patches codehilite)
+from wiki.functions.markdown import sanitizer
+
+
+EXTRA = "markdown.extensions.extra"
+EXTRA_EXTENSIONS = {"markdown.extensions." + name for name in extra.extensions}
 
 
 class ArticleMarkdown(markdown.Markdown):
@@ -13,22 +24,20 @@ class ArticleMarkdown(markdown.Markdown):
         self.article = article
         self.preview = preview
         self.user = user
+        # Registered last, so it runs after every extension's treeprocessor.
+        self.treeprocessors.register(
+            sanitizer.SanitizeTreeprocessor(self), "sanitize", -100
+        )
 
     def core_extensions(self):
         """List of functions extensions found in the mdx folder"""
         return [
-            "markdown.extensions.footnotes",
-        "markdown.extensions.attr_list",
-        "markdown.extensions.footnotes",
-        "markdown.extensions.attr_list",
-        "markdown.extensions.def_list",
-        "markdown.extensions.tables",
-        "markdown.extensions.abbr",
-        "markdown.extensions.sane_lists",
+            "markdown.extensions.sane_lists",
+        # Also loads abbr, attr_list, def_list, fenced_code, footnotes,
+        # md_in_html and tables
         "markdown.extensions.extra",
         "markdown.extensions.codehilite",
         "markdown.extensions.toc",
-        "markdown.extensions.fenced_code",
         "markdown.extensions.admonition",
         "markdown.extensions.meta",
         "markdown.extensions.nl2br",
@@ -40,30 +49,152 @@ class ArticleMarkdown(markdown.Markdown):
         extensions = list(settings.MARKDOWN_KWARGS.get("extensions", []))
         extensions += self.core_extensions()
         extensions += registry.get_markdown_extensions()
-        return extensions
+        # Loading an extension twice only registers the same processors
+        # twice, so keep the first occurrence of each one, and leave out the
+        # ones "extra" loads itself.
+        skip = set()
+        if EXTRA in extensions:
+            skip.update(EXTRA_EXTENSIONS)
+        unique_extensions = []
+        for extension in extensions:
+            if extension not in unique_extensions and extension not in skip:
+                unique_extensions.append(extension)
+        return unique_extensions
 
-    def convert(self, text, *args, **kwargs):
-        html = super().convert(text, *args, **kwargs)
-        if settings.MARKDOWN_SANITIZE_HTML:
-            tags = (
-                    settings.MARKDOWN_HTML_WHITELIST + registry.get_html_whitelist()
-            )
-            attrs = {}
-            attrs.update(settings.MARKDOWN_HTML_ATTRIBUTES)
-            attrs.update(registry.get_html_attributes().items())
-
-            html = bleach.clean(
-                html,
-                tags=tags,
-                attributes=attrs,
-                strip=True,
+    def is_user_dependent(self):
+        """
+        True if any loaded extension renders differently depending on the
+        user. Extensions declare this with a ``user_dependent = True``
+        attribute; none of the core extensions do.
+
+        The flag is all or nothing. The user-dependent parts of an article
+        are not rendered and cached apart from the rest: once one extension
+        sets it, every article is rendered and cached in full for every
+        logged-in user, and the render store is not used for them. That
+        costs one render and one cache entry per user and article, as
+        before the rendered copy was shared.
+        """
+        return any(
+            getattr(extension, "user_dependent", False)
+            for extension in self.registeredExtensions
+        )
+
+    def bind(self, article, preview=False, user=None):
+        """Attach the context of a single render to a pooled instance."""
+        self.article = article
+        self.preview = preview
+        self.user = user
+        return self
+
+    def reset(self):
+        super().reset()
+        # The abbr extension registers one inline pattern per abbreviation
+        # found in the text and never removes them again.
+        for name in [
+            item.name
+            for item in self.inlinePatterns._priority
+            if item.name.startswith("abbr-")
+        ]:
+            self.inlinePatterns.deregister(name)
+        self.article = None
+        self.preview = False
+        self.user = None
+        return self
+
+
+# Building an ArticleMarkdown resolves and instantiates every extension, which
+# costs about as much as converting an average article. Instances are therefore
+# kept in a per-thread pool and only the per-render context is swapped.
+_local = threading.local()
+
+
+def _get_pool():
+    generation = registry.get_generation()
+    if getattr(_local, "generation", None) != generation:
+        _local.pool = []
+        _local.generation = generation
+    return _local.pool
+
+
+@contextmanager
+def article_markdown_renderer(article, preview=False, user=None):
+    """
+    Borrow a configured ArticleMarkdown from the current thread's pool.
+
+    Nested renders (e.g. a plugin rendering another article) simply take
+    another instance, so the pool grows to the deepest nesting level seen.
+    """
+    pool = _get_pool()
+    md = pool.pop() if pool else ArticleMarkdown(None)
+    md.bind(article, preview=preview, user=user)
+    try:
+        yield md
+    finally:
+        md.reset()
+        # The registry may have changed while rendering; drop stale instances.
+        if pool is _get_pool():
+            pool.append(md)
+
+
+_fingerprint = {}
+
+
+def get_fingerprint():
+    """
+    Returns a short hash of everything besides the text that decides what
+    ArticleMarkdown produces: extensions, their configuration and the
+    sanitizer whitelists. Persisted renders are keyed by it.
+    """
+    generation = registry.get_generation()
+    if generation not in _fingerprint:
+        with article_markdown_renderer(None) as md:
+            extensions = md.get_markdown_extensions()
+        kwargs = dict(settings.MARKDOWN_KWARGS)
+        kwargs["extensions"] = [
+            extension
+            if isinstance(extension, str)
+            else "%s.%s" % (type(extension).__module__, type(extension).__name__)
+            for extension in extensions
+        ]
+        attrs = list(settings.MARKDOWN_HTML_ATTRIBUTES.items())
+        attrs += list(registry.get_html_attributes().items())
+        raw = repr(
+            (
+                markdown.__version__,
+                bleach.__version__,
+                sanitizer.VERSION,
+                sorted(kwargs.items()),
+                settings.MARKDOWN_SANITIZE_HTML,
+                sorted(set(settings.MARKDOWN_HTML_WHITELIST)),
+                sorted(set(registry.get_html_whitelist())),
+                sorted((tag, repr(value)) for tag, value in attrs),
+                settings.MARKDOWN_HTML_STYLES,
             )
-        return html
+        )
+        _fingerprint.clear()
+        _fingerprint[generation] = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+    return _fingerprint[generation]
+
+
+_user_dependent = {}
+
+
+def is_user_dependent():
+    """
+    Whether rendered articles have to be cached per user, in full, see
+    ArticleMarkdown.is_user_dependent().
+    """
+    generation = registry.get_generation()
+    if generation not in _user_dependent:
+        with article_markdown_renderer(None) as md:
+            _user_dependent.clear()
+            _user_dependent[generation] = md.is_user_dependent()
+    return _user_dependent[generation]
 
 
 def article_markdown(text, article, *args, **kwargs):
-    md = ArticleMarkdown(article, *args, **kwargs)
-    return md.convert(text)
+    with article_markdown_renderer(article, *args, **kwargs) as md:
+        return md.convert(text)
 
 
 def add_to_registry(processor, key, value, location):
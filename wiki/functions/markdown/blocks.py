@@ -0,0 +1,172 @@
+"""
+Rendering large articles block by block.
+
+The source is cut at ATX headings that follow a blank line and plain text,
+and the HTML of every block is cached under the hash of its text. An edit to
+one section then only renders that section again; the other blocks come from
+the cache.
+
+Markdown features that connect blocks (footnotes, abbreviations, link
+references, [TOC], raw HTML blocks that may span blank lines and de-duplicated
+heading ids) make the article render in one piece as before.
+"""
+import hashlib
+import re
+
+from django.core.cache import cache
+from django.utils import translation
+from wiki_test import settings
+from wiki.functions import stats
+from wiki.functions.markdown import article_markdown
+from wiki.functions.markdown import get_fingerprint
+from wiki.functions.markdown import is_user_dependent
+
+_heading_re = re.compile(r"#{1,6}")
+# Opening line of a fence, as the fenced_code extension matches it
+_fence_re = re.compile(
+    r"(?P<fence>~{3,}|`{3,})[ ]*"
+    r"(\{[^}\n]*\}|(\.?[\w#.+-]*[ ]*)?(hl_lines=(?P<quot>\"|').*?(?P=quot)[ ]*)?)$"
+)
+_cross_block_re = re.compile(
+    r"\[\^"  # footnotes
+    r"|^ {0,3}\*\[[^\]]*\]:"  # abbreviations
+    r"|^ {0,3}\[[^\]]+\]:"  # link references
+    r"|\[TOC\]"
+    r"|^ {0,3}<[a-zA-Z!?/]",  # raw HTML blocks
+    re.MULTILINE,
+)
+_heading_id_re = re.compile(r'<h[1-6][^>]*?\sid="([^"]*)"')
+# Lines that open or continue a list, blockquote or indented code block
+_nested_re = re.compile(r"[ \t]|>|[*+-][ \t]|\d+\.[ \t]")
+
+
+def is_plain(line):
+    """Whether a line is neither nested in a list or quote nor code."""
+    return not (_nested_re.match(line) or _fence_re.match(line))
+
+
+def split_blocks(text):
+    """
+    Returns the text cut before every ATX heading that renders the same on
+    its own: outside fenced code, after a blank line, and after a paragraph
+    that neither is nor continues a list, blockquote or code block. Markdown
+    reads a heading right after a table row or inside a list as part of
+    that, and HTML ending in code keeps a newline that a block of its own
+    loses. Joining the blocks gives back the text.
+    """
+    blocks = []
+    current = []
+    fence = None
+    # The last line, and the first and last non-blank line of the paragraph
+    # before it
+    previous = first = last = ""
+    for line in text.splitlines(keepends=True):
+        stripped = line.rstrip("\r\n")
+        if fence:
+            if stripped.rstrip(" ") == fence:
+                fence = None
+        else:
+            match = _fence_re.match(stripped)
+            if match:
+                fence = match.group("fence")
+            elif (
+                _heading_re.match(line)
+                and last
+                and not previous.strip()
+                and is_plain(first)
+                and is_plain(last)
+            ):
+                blocks.append("".join(current))
+                current = []
+        current.append(line)
+        if stripped.strip():
+            if not previous.strip():
+                first = stripped
+            last = stripped
+        previous = stripped
+    if current:
+        blocks.append("".join(current))
+    return blocks
+
+
+def get_blocks(text):
+    """
+    Returns the blocks that can be rendered on their own, which is the
+    whole text as one block if it uses features that connect blocks.
+    """
+    if _cross_block_re.search(text):
+        return [text]
+    return split_blocks(text)
+
+
+def get_block_digest(block):
+    return hashlib.sha1(block.encode("utf-8")).hexdigest()
+
+
+def has_unique_heading_ids(htmls):
+    ids = []
+    for html in htmls:
+        ids += _heading_id_re.findall(html)
+    return len(ids) == len(set(ids))
+
+
+def get_block_key(article, user, preview, block):
+    return "wiki-block-{fingerprint}-{lang}-{article}-{user}-{preview}-{digest}".format(
+        fingerprint=get_fingerprint(),
+        lang=translation.get_language() or "",
+        article=article.id if article else "",
+        user=user.get_username() if user else "shared",
+        preview="preview" if preview else "",
+        digest=get_block_digest(block),
+    )
+
+
+def render_blocks(blocks, article, preview=False, user=None, timeout=None):
+    """
+    Returns the HTML of every block, rendering only those not cached. New
+    blocks are cached for timeout seconds, CACHE_TIMEOUT by default.
+    """
+    if not (user and user.is_authenticated and is_user_dependent()):
+        user = None
+    keys = [get_block_key(article, user, preview, block) for block in blocks]
+    cached = cache.get_many(keys)
+    stats.incr("block_cache.hit", len(cached))
+    stats.incr("block_cache.miss", len(keys) - len(cached))
+
+    rendered = {}
+    htmls = []
+    for key, block in zip(keys, blocks):
+        if key in cached:
+            html = cached[key]
+        elif key in rendered:
+            html = rendered[key]
+        else:
+            html = article_markdown(block, article, preview=preview, user=user)
+            rendered[key] = html
+        htmls.append(html)
+
+    if rendered:
+        cache.set_many(
+            rendered, settings.CACHE_TIMEOUT if timeout is None else timeout
+        )
+    return htmls
+
+
+def render_by_blocks(text, article, preview=False, user=None):
+    """
+    Same output as article_markdown(), but texts of at least
+    BLOCK_CACHE_MIN_LENGTH characters are rendered and cached in blocks.
+    """
+    if (
+        settings.BLOCK_CACHE_MIN_LENGTH is None
+        or len(text) < settings.BLOCK_CACHE_MIN_LENGTH
+    ):
+        return article_markdown(text, article, preview=preview, user=user)
+    blocks = get_blocks(text)
+    if len(blocks) < 2:
+        return article_markdown(text, article, preview=preview, user=user)
+    htmls = render_blocks(blocks, article, preview=preview, user=user)
+    if not has_unique_heading_ids(htmls):
+        # Markdown numbers repeated heading ids across the whole document
+        return article_markdown(text, article, preview=preview, user=user)
+    return "\n".join(htmls)
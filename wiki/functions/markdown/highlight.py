@@ -0,0 +1,91 @@
+"""
+Memoized syntax highlighting for the codehilite and fenced_code extensions.
+
+Both extensions create a CodeHilite object per code block and call hilite(),
+which runs Pygments. Code samples rarely change between revisions, so the
+result is kept in a per-process LRU and, optionally, in the Django cache,
+keyed by the code and every option that affects the output.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.core.cache import cache
+from markdown.extensions import codehilite
+from markdown.extensions import fenced_code
+from wiki_test import settings
+from wiki.functions import stats
+
+try:
+    import pygments
+except ImportError:  # pragma: no cover
+    pygments = None
+
+_lru = OrderedDict()
+_lru_lock = threading.Lock()
+
+
+def _lru_get(key):
+    with _lru_lock:
+        html = _lru.get(key)
+        if html is not None:
+            _lru.move_to_end(key)
+        return html
+
+
+def _lru_set(key, html):
+    with _lru_lock:
+        _lru[key] = html
+        _lru.move_to_end(key)
+        while len(_lru) > settings.CODEHILITE_CACHE_SIZE:
+            _lru.popitem(last=False)
+
+
+def clear():
+    with _lru_lock:
+        _lru.clear()
+
+
+class CachedCodeHilite(codehilite.CodeHilite):
+    def get_cache_key(self, shebang):
+        formatter = self.pygments_formatter
+        if not isinstance(formatter, str):
+            formatter = "%s.%s" % (formatter.__module__, formatter.__qualname__)
+        raw = repr(
+            (
+                pygments.__version__ if pygments else None,
+                self.src,
+                self.lang,
+                self.guess_lang,
+                self.use_pygments,
+                self.lang_prefix,
+                formatter,
+                sorted((name, repr(value)) for name, value in self.options.items()),
+                shebang,
+            )
+        )
+        return "wiki-codehilite-" + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def hilite(self, shebang=True):
+        if not settings.CODEHILITE_CACHE_SIZE:
+            return super().hilite(shebang=shebang)
+        key = self.get_cache_key(shebang)
+        html = _lru_get(key)
+        if html is not None:
+            stats.incr("codehilite.hit")
+            return html
+        stats.incr("codehilite.miss")
+        if settings.CODEHILITE_SHARED_CACHE:
+            html = cache.get(key)
+            stats.incr("codehilite.shared.%s" % ("miss" if html is None else "hit"))
+        if html is None:
+            html = super().hilite(shebang=shebang)
+            if settings.CODEHILITE_SHARED_CACHE:
+                cache.set(key, html, settings.CACHE_TIMEOUT)
+        _lru_set(key, html)
+        return html
+
+
+# Both extensions look the class up in their module when highlighting
+codehilite.CodeHilite = CachedCodeHilite
+fenced_code.CodeHilite = CachedCodeHilite
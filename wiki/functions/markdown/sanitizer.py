@@ -0,0 +1,439 @@
+"""
+HTML sanitizing as the last stage of the markdown pipeline.
+
+Markdown builds an ElementTree, so elements and attributes that are not
+whitelisted can be removed from the tree before it is serialized, instead of
+parsing the serialized HTML a second time. Only raw HTML, which markdown
+keeps as strings in its stash, still has to be tokenized; those fragments are
+short and filtered tag by tag. Markdown stashes inline tags one by one, so the
+fragments of a block are filtered together and balanced like a parser would:
+end tags without an open element are dropped and elements left open are
+closed at the end of the block.
+
+The rules are the ones bleach.clean(strip=True) applied before: tags that are
+not allowed are dropped but their content is kept, comments are removed,
+attributes are checked against the tag and "*" entries of the whitelist and
+URLs are limited to bleach's allowed protocols.
+"""
+import html
+import re
+import threading
+from collections import OrderedDict
+from html.parser import HTMLParser
+from urllib.parse import urlparse
+
+import bleach
+from markdown import util
+from markdown.treeprocessors import Treeprocessor
+
+from wiki_test import settings
+from wiki.functions import registry
+
+#: Bump when the sanitizer output changes, so persisted renders are redone.
+VERSION = 2
+
+# Raw HTML fragments of at least this length (mostly highlighted code) are
+# remembered once sanitized, they come back unchanged render after render.
+FRAGMENT_CACHE_MIN_LENGTH = 1000
+FRAGMENT_CACHE_SIZE = 500
+
+URI_ATTRIBUTES = frozenset(
+    [
+        "action",
+        "background",
+        "base",
+        "cite",
+        "datasrc",
+        "dynsrc",
+        "href",
+        "longdesc",
+        "lowsrc",
+        "ping",
+        "poster",
+        "src",
+    ]
+)
+
+# Elements without content or end tag
+VOID_ELEMENTS = frozenset(
+    [
+        "area",
+        "base",
+        "br",
+        "col",
+        "embed",
+        "hr",
+        "img",
+        "input",
+        "link",
+        "meta",
+        "param",
+        "source",
+        "track",
+        "wbr",
+    ]
+)
+
+_uri_junk_re = re.compile(r"[`\000-\040\177-\240\s]+")
+# Same check html5lib's sanitizer did on style values before bleach 5.
+_style_value_re = re.compile(
+    r"""^([-/:,#%.'"\s!\w]|\w-\w|'[\s\w]+'\s*|"[\s\w]+"|\([\d,%\.\s]+\))*$"""
+)
+
+
+class Policy:
+    """The whitelists from settings and plugins, prepared for lookups."""
+
+    def __init__(self, tags, attributes, styles, protocols):
+        self.tags = frozenset(tags)
+        self.attributes = {
+            tag: allowed if callable(allowed) else self._as_set(allowed)
+            for tag, allowed in attributes.items()
+        }
+        self.any_tag = self.attributes.pop("*", None)
+        self.styles = frozenset(style.lower() for style in styles)
+        self.protocols = frozenset(protocols)
+        self._fragments = OrderedDict()
+        self._fragments_lock = threading.Lock()
+
+    def get_fragment(self, fragment):
+        with self._fragments_lock:
+            cleaned = self._fragments.get(fragment)
+            if cleaned is not None:
+                self._fragments.move_to_end(fragment)
+            return cleaned
+
+    def set_fragment(self, fragment, cleaned):
+        with self._fragments_lock:
+            self._fragments[fragment] = cleaned
+            while len(self._fragments) > FRAGMENT_CACHE_SIZE:
+                self._fragments.popitem(last=False)
+
+    @staticmethod
+    def _as_set(allowed):
+        if isinstance(allowed, str):
+            return frozenset([allowed])
+        return frozenset(allowed)
+
+    def allows_attribute(self, tag, name, value):
+        allowed = self.attributes.get(tag)
+        if allowed is not None:
+            if callable(allowed):
+                return allowed(tag, name, value)
+            if name in allowed:
+                return True
+        if self.any_tag is not None:
+            if callable(self.any_tag):
+                return self.any_tag(tag, name, value)
+            return name in self.any_tag
+        return False
+
+    def allows_uri(self, value):
+        uri = _uri_junk_re.sub("", html.unescape(value))
+        uri = uri.replace("\ufffd", "").lower()
+        try:
+            scheme = urlparse(uri).scheme
+        except ValueError:
+            return False
+        if scheme:
+            return scheme in self.protocols
+        if uri.startswith("#"):
+            return True
+        if ":" in uri:
+            return uri.split(":")[0] in self.protocols
+        return "http" in self.protocols or "https" in self.protocols
+
+    def clean_style(self, value):
+        declarations = []
+        for declaration in value.split(";"):
+            prop, sep, prop_value = declaration.partition(":")
+            prop = prop.strip().lower()
+            prop_value = prop_value.strip()
+            if not sep or prop not in self.styles:
+                continue
+            if not prop_value or not _style_value_re.match(prop_value):
+                continue
+            declarations.append("%s: %s;" % (prop, prop_value))
+        return " ".join(declarations)
+
+    def clean_attributes(self, tag, attributes):
+        """Returns the allowed (name, value) pairs of a tag."""
+        cleaned = []
+        for name, value in attributes:
+            name = name.lower()
+            if value is None:
+                value = ""
+            if not self.allows_attribute(tag, name, value):
+                continue
+            if name in URI_ATTRIBUTES and not self.allows_uri(value):
+                continue
+            if name == "style":
+                value = self.clean_style(value)
+                if not value:
+                    continue
+            cleaned.append((name, value))
+        return cleaned
+
+
+_policy = {}
+
+
+def get_policy():
+    """The sanitizing policy for the current plugin registry."""
+    generation = registry.get_generation()
+    if generation not in _policy:
+        attributes = {}
+        attributes.update(settings.MARKDOWN_HTML_ATTRIBUTES)
+        attributes.update(registry.get_html_attributes().items())
+        _policy.clear()
+        _policy[generation] = Policy(
+            tags=settings.MARKDOWN_HTML_WHITELIST + registry.get_html_whitelist(),
+            attributes=attributes,
+            styles=settings.MARKDOWN_HTML_STYLES,
+            protocols=bleach.ALLOWED_PROTOCOLS,
+        )
+    return _policy[generation]
+
+
+class FragmentSanitizer(HTMLParser):
+    """
+    Filters pieces of raw HTML token by token. The open elements are kept
+    across the fragments of one block, see sanitize_block().
+    """
+
+    def __init__(self, policy):
+        super().__init__(convert_charrefs=True)
+        self.policy = policy
+        self.out = []
+        self.open = []
+
+    def sanitize_block(self, fragments):
+        """
+        Sanitizes the fragments of one block, in document order. Returns them
+        and the end tags of the elements still open after the last one.
+        """
+        self.open = []
+        cleaned = [self.sanitize(fragment) for fragment in fragments]
+        end_tags = "".join("</%s>" % tag for tag in reversed(self.open))
+        self.open = []
+        return cleaned, end_tags
+
+    def sanitize(self, fragment):
+        # The output depends on the open elements, only fragments that
+        # start a block are remembered.
+        if len(fragment) < FRAGMENT_CACHE_MIN_LENGTH or self.open:
+            return self._sanitize(fragment)
+        cached = self.policy.get_fragment(fragment)
+        if cached is None:
+            cached = (self._sanitize(fragment), tuple(self.open))
+            self.policy.set_fragment(fragment, cached)
+        cleaned, still_open = cached
+        self.open = list(still_open)
+        return cleaned
+
+    def _sanitize(self, fragment):
+        self.reset()
+        self.out = []
+        self.feed(fragment)
+        self.close()
+        return "".join(self.out)
+
+    def _start(self, tag, attrs):
+        self.out.append("<" + tag)
+        for name, value in self.policy.clean_attributes(tag, attrs):
+            self.out.append(' %s="%s"' % (name, html.escape(value)))
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in self.policy.tags:
+            return
+        self._start(tag, attrs)
+        self.out.append(">")
+        if tag not in VOID_ELEMENTS:
+            self.open.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        if tag not in self.policy.tags:
+            return
+        self._start(tag, attrs)
+        # <div /> opens a div in HTML, close it right away
+        self.out.append(" />" if tag in VOID_ELEMENTS else "></%s>" % tag)
+
+    def handle_endtag(self, tag):
+        if tag not in self.open:
+            # Not opened in this block, it would close the page's elements
+            return
+        while self.open:
+            open_tag = self.open.pop()
+            self.out.append("</%s>" % open_tag)
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        # Character references arrive decoded, so this only escapes what
+        # really is markup.
+        self.out.append(html.escape(data, quote=False))
+
+    # Comments, doctypes and processing instructions are dropped by not
+    # overriding handle_comment, handle_decl, handle_pi and unknown_decl.
+
+
+class SanitizeTreeprocessor(Treeprocessor):
+    """Runs after all other treeprocessors, so it sees the finished tree."""
+
+    def run(self, root):
+        if not settings.MARKDOWN_SANITIZE_HTML:
+            return
+        policy = get_policy()
+        stash = self.md.htmlStash.rawHtmlBlocks
+        self.clean_children(root, policy, stash)
+        fragments = FragmentSanitizer(policy)
+        raw_html = self.md.postprocessors["raw_html"]
+        demoted = set()
+        for element, indexes in self.get_stash_blocks(root, len(stash)):
+            raw = []
+            for index in indexes:
+                block = stash[index]
+                if not isinstance(block, str):
+                    # md_in_html stashes elements, serialize them like it would.
+                    block = self.md.serializer(block)
+                raw.append(block)
+            cleaned, end_tags = fragments.sanitize_block(raw)
+            if end_tags:
+                if element is None or self._ends_with(element, indexes[-1]):
+                    # Before the newlines markdown keeps after a block
+                    last = cleaned[-1].rstrip()
+                    cleaned[-1] = last + end_tags + cleaned[-1][len(last):]
+                else:
+                    self._append_text(
+                        element, len(element), self.md.htmlStash.store(end_tags)
+                    )
+            for index, block, cleaned_block in zip(indexes, raw, cleaned):
+                if raw_html.isblocklevel(block) and not raw_html.isblocklevel(
+                    cleaned_block
+                ):
+                    demoted.add(self.md.htmlStash.get_placeholder(index))
+                stash[index] = cleaned_block
+        if demoted:
+            self.unwrap_demoted(root, demoted)
+
+    def get_stash_blocks(self, root, count):
+        """
+        Pairs of a block-level element and the stash indexes of the
+        placeholders in it, in document order. Indexes not found in the tree
+        come last, one at a time and without an element.
+        """
+        blocks = []
+        seen = set()
+
+        def collect(text, indexes):
+            if not text or "\x02" not in text:
+                return
+            for match in util.HTML_PLACEHOLDER_RE.finditer(text):
+                index = int(match.group(1))
+                if index < count and index not in seen:
+                    seen.add(index)
+                    indexes.append(index)
+
+        def walk(element, indexes):
+            collect(element.text, indexes)
+            for child in element:
+                if self.md.is_block_level(child.tag):
+                    child_indexes = []
+                    blocks.append((child, child_indexes))
+                    walk(child, child_indexes)
+                else:
+                    walk(child, indexes)
+                collect(child.tail, indexes)
+
+        root_indexes = []
+        blocks.append((root, root_indexes))
+        walk(root, root_indexes)
+        blocks.extend((None, [index]) for index in range(count) if index not in seen)
+        return [(element, indexes) for element, indexes in blocks if indexes]
+
+    def _ends_with(self, element, index):
+        """Whether the placeholder of index is the last thing in element."""
+        text = element[-1].tail if len(element) else element.text
+        return (text or "").rstrip().endswith(self.md.htmlStash.get_placeholder(index))
+
+    def clean_children(self, parent, policy, stash):
+        index = 0
+        while index < len(parent):
+            child = parent[index]
+            if not isinstance(child.tag, str):
+                # Comments and processing instructions
+                self._append_text(parent, index, child.tail)
+                parent.remove(child)
+                continue
+            self.clean_children(child, policy, stash)
+            if child.tag not in policy.tags:
+                index = self._unwrap(parent, index)
+                continue
+            if child.attrib:
+                attributes = [
+                    (name, self._unstash(value, stash))
+                    for name, value in child.attrib.items()
+                ]
+                child.attrib.clear()
+                child.attrib.update(policy.clean_attributes(child.tag, attributes))
+            index += 1
+
+    def unwrap_demoted(self, parent, placeholders):
+        """
+        Block-level raw HTML is not wrapped in a paragraph. When sanitizing
+        left only text of such a block, drop the <p> the raw_html
+        postprocessor would otherwise put around it.
+        """
+        index = 0
+        while index < len(parent):
+            child = parent[index]
+            if (
+                child.tag == "p"
+                and child.text in placeholders
+                and not len(child)
+                and not child.attrib
+            ):
+                index = self._unwrap(parent, index)
+                continue
+            self.unwrap_demoted(child, placeholders)
+            index += 1
+
+    def _unwrap(self, parent, index):
+        """
+        Replaces parent[index] by its content and returns the index of the
+        first sibling after it.
+        """
+        child = parent[index]
+        grandchildren = list(child)
+        self._append_text(parent, index, child.text)
+        parent.remove(child)
+        for offset, grandchild in enumerate(grandchildren):
+            parent.insert(index + offset, grandchild)
+        index += len(grandchildren)
+        self._append_text(parent, index, child.tail)
+        return index
+
+    @staticmethod
+    def _append_text(parent, index, text):
+        if not text:
+            return
+        if index == 0:
+            parent.text = (parent.text or "") + text
+        else:
+            parent[index - 1].tail = (parent[index - 1].tail or "") + text
+
+    @staticmethod
+    def _unstash(value, stash):
+        # Attribute values are escaped when serialized, so raw HTML that ended
+        # up in one (e.g. through attr_list) is put back as plain text before
+        # the raw_html postprocessor would paste it in unescaped.
+        if "\x02" not in value:
+            return value
+
+        def raw(match):
+            index = int(match.group(1))
+            if index < len(stash) and isinstance(stash[index], str):
+                return stash[index]
+            return ""
+
+        return util.HTML_PLACEHOLDER_RE.sub(raw, value)
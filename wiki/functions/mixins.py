@@ -1,8 +1,11 @@
 import logging
 
+from django.core.paginator import InvalidPage
+from django.http import Http404
 from django.views.generic.base import TemplateResponseMixin
 from wiki_test import settings
 from wiki.functions import registry
+from wiki.functions.paginator import CursorPaginator
 
 log = logging.getLogger(__name__)
 
@@ -24,6 +27,8 @@ class ArticleMixin(TemplateResponseMixin):
                     articles__article__current_revision__deleted=False,
                     user_can_read=request.user,
                 ):
+                    if self.urlpath and child.parent_id == self.urlpath.id:
+                        child.set_cached_ancestors_from_parent(self.urlpath)
                     self.children_slice.append(child)
             except AttributeError as e:
                 log.error(
@@ -41,3 +46,27 @@ class ArticleMixin(TemplateResponseMixin):
         kwargs["children_slice_more"] = len(self.children_slice) > 20
         kwargs["plugins"] = registry.get_plugins()
         return kwargs
+
+
+class CursorPaginationMixin:
+
+    """For ListViews: with settings.PAGINATION_CURSOR, page by cursor over the
+    view's ordering instead of by page number. get_queryset() has to order
+    by get_ordering()."""
+
+    cursor_kwarg = "cursor"
+
+    def paginate_queryset(self, queryset, page_size):
+        if not settings.PAGINATION_CURSOR:
+            return super().paginate_queryset(queryset, page_size)
+        paginator = CursorPaginator(
+            queryset,
+            page_size,
+            self.get_ordering(),
+            count_limit=settings.PAGINATION_COUNT_LIMIT,
+        )
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidPage as e:
+            raise Http404(str(e))
+        return (paginator, page, page.object_list, page.has_other_pages())
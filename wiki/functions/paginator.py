@@ -1,4 +1,15 @@
+import base64
+import collections.abc
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
 from django.core.paginator import Paginator
+from django.db.models import F
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.translation import gettext as _
 
 
 class WikiPaginator(Paginator):
@@ -31,3 +42,139 @@ class WikiPaginator(Paginator):
         if self.num_pages > 1:
             pages += [self.num_pages]
         return pages
+
+
+class CursorPage(collections.abc.Sequence):
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return "<Page after %s>" % (self.previous_cursor or "start")
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Pages through a queryset by the values of the last row shown instead of
+    an offset, so a deep page costs as much as the first one. The ordering
+    has to end with a unique field, e.g. ("-created", "-id"), and its fields
+    must not be NULL.
+
+    There are no page numbers. count is only computed if it is asked for,
+    and stops at count_limit: count_capped tells that there are more.
+    """
+
+    keyset = True
+
+    def __init__(self, object_list, per_page, ordering, count_limit=None):
+        self.fields = [
+            (field.lstrip("-"), field.startswith("-")) for field in ordering
+        ]
+        self.object_list = object_list.order_by(*ordering).annotate(
+            **{
+                "cursor_key_%d" % index: F(field)
+                for index, (field, _) in enumerate(self.fields)
+            }
+        )
+        self.per_page = int(per_page)
+        self.count_limit = count_limit
+
+    @cached_property
+    def _count(self):
+        queryset = self.object_list.order_by()
+        if self.count_limit is not None:
+            queryset = queryset[: self.count_limit + 1]
+        return queryset.count()
+
+    @property
+    def count(self):
+        if self.count_capped:
+            return self.count_limit
+        return self._count
+
+    @property
+    def count_capped(self):
+        return self.count_limit is not None and self._count > self.count_limit
+
+    def encode_cursor(self, obj, backwards=False):
+        values = []
+        for index in range(len(self.fields)):
+            value = getattr(obj, "cursor_key_%d" % index)
+            if isinstance(value, (datetime.date, datetime.time)):
+                value = value.isoformat()
+            values.append(value)
+        data = json.dumps(["p" if backwards else "n"] + values, separators=(",", ":"))
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        try:
+            data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            direction, *values = json.loads(data)
+        except (ValueError, TypeError):
+            raise InvalidPage(_("Invalid cursor"))
+        if direction not in ("n", "p") or len(values) != len(self.fields):
+            raise InvalidPage(_("Invalid cursor"))
+        return direction == "p", values
+
+    def get_condition(self, values, backwards):
+        """Rows after values in the ordering, or before them if backwards."""
+        condition = Q()
+        equal = {}
+        for (field, descending), value in zip(self.fields, values):
+            lookup = "lt" if descending != backwards else "gt"
+            condition |= Q(**equal, **{"%s__%s" % (field, lookup): value})
+            equal[field] = value
+        # The first field alone, so that an index on it is used for the range
+        field, descending = self.fields[0]
+        lookup = "lte" if descending != backwards else "gte"
+        return Q(**{"%s__%s" % (field, lookup): values[0]}) & condition
+
+    def page(self, cursor=None):
+        queryset = self.object_list
+        backwards = False
+        if cursor:
+            backwards, values = self.decode_cursor(cursor)
+            try:
+                queryset = queryset.filter(self.get_condition(values, backwards))
+            except (ValidationError, ValueError, TypeError):
+                raise InvalidPage(_("Invalid cursor"))
+        if backwards:
+            queryset = queryset.reverse()
+        try:
+            rows = list(queryset[: self.per_page + 1])
+        except (ValidationError, ValueError, TypeError):
+            raise InvalidPage(_("Invalid cursor"))
+        more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = True, more
+        else:
+            has_next, has_previous = more, bool(cursor)
+        return CursorPage(
+            rows,
+            self,
+            next_cursor=self.encode_cursor(rows[-1]) if rows and has_next else None,
+            previous_cursor=(
+                self.encode_cursor(rows[0], backwards=True)
+                if rows and has_previous
+                else None
+            ),
+        )
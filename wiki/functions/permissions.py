@@ -1,3 +1,5 @@
+from django.db.models import prefetch_related_objects
+from django.utils.functional import cached_property
 from wiki_test import settings
 
 ###############################
@@ -12,10 +14,57 @@ from wiki_test import settings
 # settings variable in wiki.conf.settings to a callable(article, user)
 
 
+class PermissionContext:
+
+    """What the permission checks need to know about a user: the ids of
+    their groups and their wiki permissions. Each is loaded the first time
+    it is needed and then kept, like Django keeps has_perm() results on the
+    user object. Use get_context(), which keeps one context per user object,
+    so for request.user one per request."""
+
+    def __init__(self, user):
+        self.user = user
+        self.is_anonymous = user.is_anonymous
+        self.user_id = None if self.is_anonymous else user.pk
+
+    @cached_property
+    def group_ids(self):
+        if self.is_anonymous:
+            return frozenset()
+        return frozenset(self.user.groups.values_list("id", flat=True))
+
+    @cached_property
+    def can_moderate(self):
+        return not self.is_anonymous and self.user.has_perm("wiki.moderate")
+
+    @cached_property
+    def can_assign(self):
+        return not self.is_anonymous and self.user.has_perm("wiki.assign")
+
+    @cached_property
+    def can_admin(self):
+        return not self.is_anonymous and self.user.has_perm("wiki.admin")
+
+    def is_owner(self, article):
+        return self.user_id is not None and article.owner_id == self.user_id
+
+    def in_group(self, article):
+        return article.group_id is not None and article.group_id in self.group_ids
+
+
+def get_context(user):
+    context = getattr(user, "_wiki_permission_context", None)
+    if context is None:
+        context = PermissionContext(user)
+        user._wiki_permission_context = context
+    return context
+
+
 def can_read(article, user):
     if callable(settings.CAN_READ):
         return settings.CAN_READ(article, user)
     else:
+        context = get_context(user)
         # Deny reading access to deleted articles if user has no delete access
         article_is_deleted = (
             article.current_revision and article.current_revision.deleted
@@ -24,37 +73,90 @@ def can_read(article, user):
             return False
 
         # Check access for other users...
-        if user.is_anonymous and not settings.ANONYMOUS:
+        if context.is_anonymous and not settings.ANONYMOUS:
             return False
         elif article.other_read:
             return True
-        elif user.is_anonymous:
+        elif context.is_anonymous:
             return False
-        if user == article.owner:
+        if context.is_owner(article):
+            return True
+        if article.group_read and context.in_group(article):
             return True
-        if article.group_read:
-            if article.group and user.groups.filter(id=article.group.id).exists():
-                return True
         if article.can_moderate(user):
             return True
         return False
 
 
+def has_custom_read_policy():
+    """Whether CAN_READ or CAN_READ_BATCH replace the built-in rules, which
+    the can_read() querysets know nothing about."""
+    return callable(settings.CAN_READ) or callable(settings.CAN_READ_BATCH)
+
+
+def filter_readable(objects, user):
+    """
+    The objects the user may read, in their order. objects are articles or
+    objects with an article, like URLPaths and plugins. A list costs a
+    constant number of queries: articles and current revisions that are not
+    loaded yet are fetched together, and CAN_READ_BATCH, if set, gets all
+    articles in one call.
+    """
+    objects = list(objects)
+    if not objects:
+        return objects
+    if hasattr(objects[0], "article_id"):
+        prefetch_related_objects(objects, "article__current_revision")
+        articles = [obj.article for obj in objects]
+    else:
+        prefetch_related_objects(objects, "current_revision")
+        articles = objects
+    if callable(settings.CAN_READ_BATCH):
+        readable = {
+            article.id
+            for article in settings.CAN_READ_BATCH(
+                [article for article in articles if article is not None], user
+            )
+        }
+        return [
+            obj
+            for obj, article in zip(objects, articles)
+            if article is not None and article.id in readable
+        ]
+    return [
+        obj
+        for obj, article in zip(objects, articles)
+        if article is not None and can_read(article, user)
+    ]
+
+
+def iter_readable(queryset, user, chunk_size=100):
+    """The readable objects of a queryset, checked chunk_size at a time, for
+    lists that may stop early."""
+    start = 0
+    while True:
+        chunk = list(queryset[start:start + chunk_size])
+        yield from filter_readable(chunk, user)
+        if len(chunk) < chunk_size:
+            return
+        start += chunk_size
+
+
 def can_write(article, user):
     if callable(settings.CAN_WRITE):
         return settings.CAN_WRITE(article, user)
+    context = get_context(user)
     # Check access for other users...
-    if user.is_anonymous and not settings.ANONYMOUS_WRITE:
+    if context.is_anonymous and not settings.ANONYMOUS_WRITE:
         return False
     elif article.other_write:
         return True
-    elif user.is_anonymous:
+    elif context.is_anonymous:
         return False
-    if user == article.owner:
+    if context.is_owner(article):
+        return True
+    if article.group_write and context.in_group(article):
         return True
-    if article.group_write:
-        if article.group and user and user.groups.filter(id=article.group.id).exists():
-            return True
     if article.can_moderate(user):
         return True
     return False
@@ -63,7 +165,7 @@ def can_write(article, user):
 def can_assign(article, user):
     if callable(settings.CAN_ASSIGN):
         return settings.CAN_ASSIGN(article, user)
-    return not user.is_anonymous and user.has_perm("wiki.assign")
+    return get_context(user).can_assign
 
 
 def can_assign_owner(article, user):
@@ -75,24 +177,23 @@ def can_assign_owner(article, user):
 def can_change_permissions(article, user):
     if callable(settings.CAN_CHANGE_PERMISSIONS):
         return settings.CAN_CHANGE_PERMISSIONS(article, user)
-    return not user.is_anonymous and (
-        article.owner == user or user.has_perm("wiki.assign")
-    )
+    context = get_context(user)
+    return context.is_owner(article) or context.can_assign
 
 
 def can_delete(article, user):
     if callable(settings.CAN_DELETE):
         return settings.CAN_DELETE(article, user)
-    return not user.is_anonymous and article.can_write(user)
+    return not get_context(user).is_anonymous and article.can_write(user)
 
 
 def can_moderate(article, user):
     if callable(settings.CAN_MODERATE):
         return settings.CAN_MODERATE(article, user)
-    return not user.is_anonymous and user.has_perm("wiki.moderate")
+    return get_context(user).can_moderate
 
 
 def can_admin(article, user):
     if callable(settings.CAN_ADMIN):
         return settings.CAN_ADMIN(article, user)
-    return not user.is_anonymous and user.has_perm("wiki.admin")
+    return get_context(user).can_admin
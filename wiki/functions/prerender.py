@@ -0,0 +1,108 @@
+"""
+Background rendering of new revisions, so that the first reader after an
+edit does not pay for markdown and sanitizing inside their request.
+
+Jobs run on a small in-process thread pool (WIKI_PRERENDER). Without it,
+``manage.py wiki_prerender`` renders whatever is missing from the render
+store.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.db import connection
+from django.utils import translation
+from wiki_test import settings
+from wiki.functions import stats
+from wiki.functions.markdown import is_user_dependent
+from wiki.functions.markdown.blocks import render_by_blocks
+
+log = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.PRERENDER_WORKERS,
+                thread_name_prefix="wiki-prerender",
+            )
+        return _executor
+
+
+def prerender_revision(revision):
+    """
+    Renders a revision into the render store and, if it is the article's
+    current revision, into the cache.
+    """
+    from wiki.models import RenderedRevision
+
+    article = revision.article
+    # Taken before rendering. If the article's cache is cleared meanwhile,
+    # the HTML may already be outdated and is neither stored nor cached.
+    key = article.get_cache_content_key()
+    html = RenderedRevision.get_html(revision)
+    if html is None:
+        html = render_by_blocks(revision.content, article)
+        if article.get_cache_content_key() != key:
+            return html
+        RenderedRevision.store_html(revision, html)
+    if revision.plain_text is None:
+        revision.set_plain_text(html)
+    if article.current_revision_id == revision.id:
+        cache.set(key, html, settings.CACHE_TIMEOUT)
+    return html
+
+
+def _run(revision_id, language, queued_at):
+    from wiki.models import ArticleRevision
+
+    try:
+        with translation.override(language):
+            revision = ArticleRevision.objects.select_related(
+                "article__current_revision"
+            ).get(id=revision_id)
+            prerender_revision(revision)
+    except ArticleRevision.DoesNotExist:
+        stats.incr("prerender.skipped")
+    except Exception:
+        log.exception("Failed to prerender revision %s", revision_id)
+        stats.incr("prerender.failed")
+    else:
+        stats.incr("prerender.done")
+    finally:
+        stats.incr("prerender.latency_ms", int((time.monotonic() - queued_at) * 1000))
+        # Worker threads must not keep their database connection forever
+        connection.close()
+
+
+def enqueue(revision_id):
+    """Queue a revision for background rendering. Returns False if disabled."""
+    if not settings.PRERENDER or is_user_dependent():
+        return False
+    stats.incr("prerender.queued")
+    _get_executor().submit(
+        _run, revision_id, translation.get_language(), time.monotonic()
+    )
+    return True
+
+
+def get_stats():
+    counters = stats.get_counters()
+    finished = sum(
+        counters.get("prerender." + name, 0) for name in ("done", "failed", "skipped")
+    )
+    return {
+        "queue_depth": counters.get("prerender.queued", 0) - finished,
+        "done": counters.get("prerender.done", 0),
+        "failed": counters.get("prerender.failed", 0),
+        "average_latency_ms": (
+            counters.get("prerender.latency_ms", 0) / finished if finished else None
+        ),
+    }
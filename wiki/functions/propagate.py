@@ -0,0 +1,154 @@
+"""
+Applying an article's permissions, group or owner to everything below it.
+
+Saving descendant by descendant fires the save signals for every one of
+them, and each save invalidates the cache of all its ancestors. Here the
+descendants are found by their tree range and updated with a few UPDATE
+statements of BATCH_SIZE articles each, their ArticleGrant rows are rebuilt
+batch by batch, and the caches are invalidated once at the end.
+
+Subtrees with more than PROPAGATE_BACKGROUND_MIN articles are updated by a
+background thread instead of inside the request. Its progress is kept in
+the cache, see get_progress().
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.db import connection
+from django.db import transaction
+from django.utils import timezone
+from wiki_test import settings
+from wiki.functions import stats
+
+log = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+#: The Article fields each kind of propagation copies
+FIELDS = {
+    "permissions": ("group_read", "group_write", "other_read", "other_write"),
+    "group": ("group_id",),
+    "owner": ("owner_id",),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # One worker, so that jobs on the same subtree apply in order
+            _executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="wiki-propagate"
+            )
+        return _executor
+
+
+def get_progress_key(article_id):
+    return "wiki-propagate-{}".format(article_id)
+
+
+def get_progress(article_id):
+    """(done, total) of a running background job for the article, or None."""
+    return cache.get(get_progress_key(article_id))
+
+
+def _inheriting_trees(article):
+    """The MPTT objects of the article whose descendants inherit from it."""
+    for relation in article.articleforobject_set.filter(is_mptt=True):
+        obj = relation.content_object
+        if obj is not None and getattr(obj, "INHERIT_PERMISSIONS", False):
+            yield obj
+
+
+def count_descendants(article):
+    """Number of descendants, from the tree ranges, without a query per tree."""
+    return sum(
+        (obj.rght - obj.lft - 1) // 2 for obj in _inheriting_trees(article)
+    )
+
+
+def get_descendant_article_ids(article):
+    article_ids = []
+    for obj in _inheriting_trees(article):
+        article_ids.extend(obj.get_descendants().values_list("article_id", flat=True))
+    return [article_id for article_id in dict.fromkeys(article_ids) if article_id != article.id]
+
+
+def get_values(article, kinds):
+    values = {}
+    for kind in kinds:
+        for field in FIELDS[kind]:
+            values[field] = getattr(article, field)
+    return values
+
+
+@transaction.atomic
+def propagate(article, values, batch_size=BATCH_SIZE, progress=None):
+    """
+    Sets the Article fields in values on all descendants of article.
+    progress is called with (updated, total) after every batch. Returns the
+    number of articles updated.
+    """
+    from wiki.models import Article
+    from wiki.models import ArticleGrant
+
+    article_ids = get_descendant_article_ids(article)
+    total = len(article_ids)
+    # Like save() would, through auto_now
+    values = dict(values, modified=timezone.now())
+    for start in range(0, total, batch_size):
+        batch = article_ids[start:start + batch_size]
+        Article.objects.filter(id__in=batch).update(**values)
+        ArticleGrant.rebuild(batch)
+        done = min(start + batch_size, total)
+        log.debug("Propagated to %d of %d articles", done, total)
+        if progress:
+            progress(done, total)
+    # Everything below and above the article, as the single saves would have
+    Article.clear_cache_for_ids(
+        article_ids + [ancestor.article_id for ancestor in article.ancestor_objects()]
+    )
+    return total
+
+
+def _run(article_id, values):
+    from wiki.models import Article
+
+    key = get_progress_key(article_id)
+
+    def progress(done, total):
+        cache.set(key, (done, total), settings.CACHE_TIMEOUT)
+
+    try:
+        propagate(Article.objects.get(id=article_id), values, progress=progress)
+    except Article.DoesNotExist:
+        stats.incr("propagate.skipped")
+    except Exception:
+        log.exception("Failed to propagate permissions of article %s", article_id)
+        stats.incr("propagate.failed")
+    else:
+        stats.incr("propagate.done")
+    finally:
+        cache.delete(key)
+        connection.close()
+
+
+def enqueue(article, values):
+    """
+    Runs propagate() on the background thread once the current transaction
+    has committed. values are taken now, later changes to article are not
+    applied.
+    """
+    cache.set(
+        get_progress_key(article.id),
+        (0, count_descendants(article)),
+        settings.CACHE_TIMEOUT,
+    )
+    article_id = article.id
+    values = dict(values)
+    transaction.on_commit(lambda: _get_executor().submit(_run, article_id, values))
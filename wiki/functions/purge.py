@@ -0,0 +1,86 @@
+"""
+Purging whole subtrees.
+
+Deleting article by article fires the delete signals for every one of them:
+on_article_delete looks up lost-and-found and moves the children away just
+before they are deleted too, and every article invalidates the cache of all
+its ancestors. A purge collects the subtree by its tree range, deletes it in
+batches of articles with the related revisions, plugins, relations and paths
+going in the same statements, and invalidates once at the end. The signal
+handlers check is_purging() and leave the work to the purge.
+"""
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import F
+from wiki.functions import tree
+
+log = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+_local = threading.local()
+
+
+def is_purging():
+    return getattr(_local, "purging", False)
+
+
+@contextmanager
+def purging():
+    previous = is_purging()
+    _local.purging = True
+    try:
+        yield
+    finally:
+        _local.purging = previous
+
+
+@transaction.atomic
+def purge_subtree(urlpath, batch_size=BATCH_SIZE, progress=None):
+    """
+    Deletes urlpath, all its descendants and their articles. progress is
+    called with (deleted, total) articles after every batch. Returns the
+    number of articles deleted.
+    """
+    from wiki.models import Article
+    from wiki.models import URLPath
+
+    tree_id, lft, rght = urlpath.tree_id, urlpath.lft, urlpath.rght
+    subtree = URLPath.objects.filter(tree_id=tree_id, lft__gte=lft, rght__lte=rght)
+    # Deepest first, so the paths deleted with a batch have no children left
+    rows = list(subtree.order_by("-level").values_list("id", "article_id"))
+    article_ids = list(dict.fromkeys(article_id for _, article_id in rows))
+    ancestor_article_ids = list(
+        URLPath.objects.filter(tree_id=tree_id, lft__lt=lft, rght__gt=rght).values_list(
+            "article_id", flat=True
+        )
+    )
+    total = len(article_ids)
+
+    with purging():
+        for start in range(0, total, batch_size):
+            Article.objects.filter(id__in=article_ids[start:start + batch_size]).delete()
+            done = min(start + batch_size, total)
+            log.debug("Purged %d of %d articles", done, total)
+            if progress:
+                progress(done, total)
+        # Paths whose article was shared with another path are left
+        subtree.delete()
+
+    # Close the gap the subtree leaves in the tree
+    width = rght - lft + 1
+    URLPath.objects.filter(tree_id=tree_id, lft__gt=rght).update(lft=F("lft") - width)
+    URLPath.objects.filter(tree_id=tree_id, rght__gt=rght).update(
+        rght=F("rght") - width
+    )
+
+    URLPath.add_child_count(urlpath.parent_id, -1)
+    Article.clear_cache_for_ids(ancestor_article_ids)
+    if len(rows) > tree.MAX_CHANGES:
+        tree.record_reset()
+    else:
+        tree.record_change(urlpath_ids=[urlpath_id for urlpath_id, _ in rows])
+    return total
@@ -7,9 +7,13 @@ _article_tabs = []
 _sidebar = []
 _html_whitelist = []
 _html_attributes = {}
+# Bumped on every registration so that objects built from the registry
+# (e.g. pooled markdown renderers) know when to rebuild themselves.
+_generation = 0
 
 
 def register(PluginClass):
+    global _generation
     if PluginClass in _cache:
         raise Exception("Plugin class already registered")
     plugin = PluginClass()
@@ -36,6 +40,8 @@ def register(PluginClass):
 
     _html_attributes.update(getattr(PluginClass, "html_attributes", {}))
 
+    _generation += 1
+
 
 def get_plugins():
     return _cache
@@ -63,3 +69,7 @@ def get_html_whitelist():
 
 def get_html_attributes():
     return _html_attributes
+
+
+def get_generation():
+    return _generation
@@ -0,0 +1,34 @@
+import threading
+from collections import Counter
+
+# Process-local counters for monitoring the render and cache machinery.
+# Every worker process keeps its own numbers.
+
+_lock = threading.Lock()
+_counters = Counter()
+
+
+def incr(name, value=1):
+    with _lock:
+        _counters[name] += value
+
+
+def get_counters():
+    with _lock:
+        return dict(_counters)
+
+
+def get_hit_rate(prefix):
+    """Returns hits / (hits + misses) for counters named <prefix>.hit and
+    <prefix>.miss, or None if neither has been counted yet."""
+    with _lock:
+        hits = _counters[prefix + ".hit"]
+        misses = _counters[prefix + ".miss"]
+    if not hits + misses:
+        return None
+    return hits / (hits + misses)
+
+
+def reset():
+    with _lock:
+        _counters.clear()
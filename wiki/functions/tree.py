@@ -0,0 +1,269 @@
+"""
+A per-process snapshot of the URLPath tree.
+
+Resolving a path only needs ids, parents and slugs, so a compact copy of
+those is kept in memory instead of asking the database for every step. The
+URLPath and its ancestors are then fetched in one query by id. Everything
+else that reads the tree needs the full rows anyway and still queries them.
+
+Every change to the tree is recorded under an increasing version number in
+the cache. A process that finds its snapshot behind reloads only the rows
+named in the missed change records, and the whole tree when records are
+missing or the version counter was lost (a new epoch).
+"""
+import threading
+import uuid
+from array import array
+
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from wiki_test import settings
+from wiki.functions import stats
+
+EPOCH_KEY = "wiki-tree-epoch"
+VERSION_KEY = "wiki-tree-version"
+
+# Beyond this many missed changes a full reload is cheaper
+MAX_CHANGES = 200
+
+_snapshots = {}
+_lock = threading.Lock()
+
+
+def get_change_key(epoch, version):
+    return "wiki-tree-change-{}-{}".format(epoch, version)
+
+
+def _new_epoch():
+    epoch = uuid.uuid4().hex[:12]
+    cache.set(EPOCH_KEY, epoch, None)
+    cache.set(VERSION_KEY, 0, None)
+    return epoch, 0
+
+
+def _record_change(urlpath_ids):
+    epoch = cache.get(EPOCH_KEY)
+    try:
+        if epoch is None:
+            raise ValueError
+        version = cache.incr(VERSION_KEY)
+    except ValueError:
+        # Counter or epoch lost, every snapshot has to be reloaded anyway
+        _new_epoch()
+        return
+    cache.set(
+        get_change_key(epoch, version),
+        {"urlpaths": list(urlpath_ids)},
+        settings.CACHE_TIMEOUT,
+    )
+
+
+def record_change(urlpath_ids):
+    """
+    Tell all processes that these URLPaths changed. Recorded when the
+    transaction commits, so that a refresh never reads the rows before they
+    are visible.
+    """
+    if not settings.TREE_SNAPSHOT:
+        return
+    urlpath_ids = list(urlpath_ids)
+    transaction.on_commit(lambda: _record_change(urlpath_ids))
+
+
+def record_reset():
+    """Makes every process reload the tree, for changes too big to list."""
+    if not settings.TREE_SNAPSHOT:
+        return
+    transaction.on_commit(_new_epoch)
+
+
+class TreeSnapshot:
+
+    """
+    Column arrays indexed by position. Removed nodes leave a hole (parent
+    -2) until the next full load.
+
+    A snapshot is not changed once it is shared. Changes are applied to a
+    copy, so threads still resolving paths in it never see half of one.
+    """
+
+    def __init__(self, site_id, epoch, version):
+        self.site_id = site_id
+        self.epoch = epoch
+        self.version = version
+        self.ids = array("q")
+        self.parents = array("q")
+        self.slugs = []
+        self.positions = {}
+        self.children = {}
+        self.roots = []
+
+    @classmethod
+    def get_rows(cls, site_id, condition=None):
+        from wiki.models import URLPath
+
+        queryset = URLPath.objects.filter(site_id=site_id)
+        if condition is not None:
+            queryset = queryset.filter(condition)
+        # Parents come before their children
+        return queryset.order_by("tree_id", "lft").values_list("id", "parent_id", "slug")
+
+    @classmethod
+    def load(cls, site_id, epoch, version):
+        snapshot = cls(site_id, epoch, version)
+        for row in cls.get_rows(site_id).iterator(chunk_size=2000):
+            snapshot._set(*row)
+        for siblings in snapshot.children.values():
+            snapshot._sort(siblings)
+        stats.incr("tree_snapshot.load")
+        return snapshot
+
+    def copy(self, version):
+        snapshot = TreeSnapshot(self.site_id, self.epoch, version)
+        snapshot.ids = self.ids[:]
+        snapshot.parents = self.parents[:]
+        snapshot.slugs = self.slugs[:]
+        snapshot.positions = self.positions.copy()
+        snapshot.children = {
+            parent: siblings[:] for parent, siblings in self.children.items()
+        }
+        snapshot.roots = self.roots[:]
+        return snapshot
+
+    def _slug_key(self, slug):
+        slug = slug or ""
+        return slug if settings.URL_CASE_SENSITIVE else slug.lower()
+
+    def _sort(self, siblings):
+        siblings.sort(key=lambda position: self._slug_key(self.slugs[position]))
+
+    def _set(self, id, parent_id, slug):
+        """Adds or updates a row. Returns False if its parent is unknown."""
+        if parent_id is None:
+            parent = -1
+        else:
+            parent = self.positions.get(parent_id)
+            if parent is None:
+                return False
+        position = self.positions.get(id)
+        if position is None:
+            position = len(self.ids)
+            self.positions[id] = position
+            self.ids.append(id)
+            self.parents.append(parent)
+            self.slugs.append(slug)
+            self._link(position, parent)
+            return True
+        if self.parents[position] != parent or self.slugs[position] != slug:
+            self._unlink(position)
+            self.parents[position] = parent
+            self.slugs[position] = slug
+            self._link(position, parent)
+            if parent >= 0:
+                self._sort(self.children[parent])
+        return True
+
+    def _link(self, position, parent):
+        if parent == -1:
+            self.roots.append(position)
+        else:
+            self.children.setdefault(parent, []).append(position)
+
+    def _unlink(self, position):
+        parent = self.parents[position]
+        siblings = self.roots if parent == -1 else self.children.get(parent, [])
+        if position in siblings:
+            siblings.remove(position)
+
+    def _remove(self, position):
+        for child in list(self.children.pop(position, [])):
+            self._remove(child)
+        self._unlink(position)
+        self.parents[position] = -2
+        del self.positions[self.ids[position]]
+
+    def catch_up(self, epoch, version):
+        """
+        Returns a copy with the changes recorded since this snapshot was
+        taken, the snapshot itself if there were none, or None if the tree
+        has to be reloaded.
+        """
+        if epoch != self.epoch or version < self.version:
+            return None
+        if version == self.version:
+            return self
+        if version - self.version > MAX_CHANGES:
+            return None
+        keys = [get_change_key(epoch, v) for v in range(self.version + 1, version + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return None
+        urlpath_ids = set()
+        for change in changes.values():
+            urlpath_ids.update(change["urlpaths"])
+        rows = list(self.get_rows(self.site_id, Q(id__in=urlpath_ids)))
+        snapshot = self.copy(version)
+        for row in rows:
+            if not snapshot._set(*row):
+                return None
+        for id in urlpath_ids - {row[0] for row in rows}:
+            if id in snapshot.positions:
+                snapshot._remove(snapshot.positions[id])
+        stats.incr("tree_snapshot.refresh")
+        return snapshot
+
+    def get_ancestor_ids(self, id):
+        """Ids from the root down to the parent of the node."""
+        ancestors = []
+        position = self.parents[self.positions[id]]
+        while position >= 0:
+            ancestors.append(self.ids[position])
+            position = self.parents[position]
+        ancestors.reverse()
+        return ancestors
+
+    def resolve(self, path):
+        """The id of the URLPath at path, or None."""
+        if len(self.roots) != 1:
+            return None
+        position = self.roots[0]
+        path = path.strip("/")
+        for slug in path.split("/") if path else []:
+            position = self._find_child(position, self._slug_key(slug))
+            if position is None:
+                return None
+        return self.ids[position]
+
+    def _find_child(self, position, key):
+        # Binary search, the children are sorted by their slug key
+        siblings = self.children.get(position, [])
+        low, high = 0, len(siblings)
+        while low < high:
+            middle = (low + high) // 2
+            if self._slug_key(self.slugs[siblings[middle]]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(siblings) and self._slug_key(self.slugs[siblings[low]]) == key:
+            return siblings[low]
+        return None
+
+
+def get_snapshot(site=None):
+    """The current tree of the site, refreshed if the tree has changed."""
+    site_id = site.id if site else Site.objects.get_current().id
+    state = cache.get_many([EPOCH_KEY, VERSION_KEY])
+    epoch, version = state.get(EPOCH_KEY), state.get(VERSION_KEY)
+    if epoch is None or version is None:
+        epoch, version = _new_epoch()
+    with _lock:
+        snapshot = _snapshots.get(site_id)
+        if snapshot is not None:
+            snapshot = snapshot.catch_up(epoch, version)
+        if snapshot is None:
+            snapshot = TreeSnapshot.load(site_id, epoch, version)
+        _snapshots[site_id] = snapshot
+    return snapshot
+
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from wiki import models
+from wiki.functions.markdown import get_fingerprint
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete stored revision renders. By default only renders made with a "
+        "different markdown/plugin configuration than the current one are removed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Delete every stored render, not only the outdated ones.",
+        )
+
+    def handle(self, *args, **options):
+        renders = models.RenderedRevision.objects.all()
+        if not options["all"]:
+            renders = renders.exclude(fingerprint=get_fingerprint())
+        deleted, _ = renders.delete()
+        self.stdout.write("Deleted %d stored render(s)." % deleted)
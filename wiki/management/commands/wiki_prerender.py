@@ -0,0 +1,77 @@
+import time
+
+from django.conf import settings as django_settings
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db.models import Exists
+from django.db.models import OuterRef
+from django.db.models import Q
+from django.utils import translation
+from wiki import models
+from wiki_test import settings
+from wiki.functions.markdown import get_fingerprint
+from wiki.functions.prerender import prerender_revision
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the current revision of every article that is missing from the "
+        "render store or has no plain-text extract yet. Use --loop to keep "
+        "running as a background worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling for new revisions instead of exiting.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5,
+            help="Seconds to sleep between polls with --loop (default: 5).",
+        )
+        parser.add_argument(
+            "--language",
+            default=None,
+            help="Language to render for (default: LANGUAGE_CODE).",
+        )
+
+    def get_missing(self):
+        stored = models.RenderedRevision.objects.filter(
+            revision=OuterRef("pk"),
+            fingerprint=get_fingerprint(),
+            language=translation.get_language() or "",
+        )
+        return (
+            models.ArticleRevision.objects.filter(current_set__isnull=False)
+            # Revisions stored before plain_text existed still need theirs
+            .filter(~Exists(stored) | Q(plain_text__isnull=True))
+            .select_related("article__current_revision")
+        )
+
+    def render_missing(self):
+        rendered = 0
+        for revision in self.get_missing().iterator():
+            prerender_revision(revision)
+            rendered += 1
+        return rendered
+
+    def handle(self, *args, **options):
+        if not settings.RENDER_STORE:
+            # Nothing would be stored, every run would render everything
+            raise CommandError("WIKI_RENDER_STORE is off, there is nothing to fill.")
+        language = options["language"] or django_settings.LANGUAGE_CODE
+        with translation.override(language):
+            while True:
+                started = time.monotonic()
+                rendered = self.render_missing()
+                if rendered or not options["loop"]:
+                    self.stdout.write(
+                        "Rendered %d revision(s) in %.2fs."
+                        % (rendered, time.monotonic() - started)
+                    )
+                if not options["loop"]:
+                    break
+                time.sleep(options["interval"])
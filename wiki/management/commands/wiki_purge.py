@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from wiki import models
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete an article together with all articles below it, for subtrees "
+        "too large to purge from the web interface."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path of the topmost article, e.g. a/b/")
+
+    def handle(self, *args, **options):
+        try:
+            urlpath = models.URLPath.get_by_path(options["path"])
+        except models.URLPath.DoesNotExist:
+            raise CommandError("No article at %s" % options["path"])
+        if not urlpath.parent_id:
+            raise CommandError("The root article cannot be purged.")
+
+        def progress(deleted, total):
+            self.stdout.write("%d/%d" % (deleted, total))
+
+        deleted = urlpath.delete_subtree(progress=progress)
+        self.stdout.write("Purged %d article(s)." % deleted)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from wiki import models
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute who may read and write each article, after changing "
+        "WIKI_ANONYMOUS or WIKI_ANONYMOUS_WRITE or loading fixtures."
+    )
+
+    def handle(self, *args, **options):
+        article_ids = list(models.Article.objects.values_list("id", flat=True))
+
+        def progress(done, total):
+            self.stdout.write("%d/%d" % (done, total))
+
+        models.ArticleGrant.rebuild(article_ids, progress=progress)
+        self.stdout.write("Rebuilt the grants of %d article(s)." % len(article_ids))
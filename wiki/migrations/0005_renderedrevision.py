@@ -0,0 +1,30 @@
+# Generated by Django 4.1.2 on 2026-10-17 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0004_articleplugin_alter_article_created_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RenderedRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(editable=False, max_length=40)),
+                ('language', models.CharField(editable=False, max_length=15)),
+                ('html', models.TextField(blank=True, editable=False)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('revision', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='renders', to='wiki.articlerevision', verbose_name='修订')),
+            ],
+            options={
+                'verbose_name': 'rendered revision',
+                'verbose_name_plural': 'rendered revisions',
+                'unique_together': {('revision', 'fingerprint', 'language')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.2 on 2026-10-17 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0005_renderedrevision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='articlerevision',
+            name='plain_text',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+    ]
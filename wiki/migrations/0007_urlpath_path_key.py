@@ -0,0 +1,54 @@
+# Generated by Django 4.1.2 on 2026-10-17 14:20
+
+from django.db import migrations, models
+
+
+def populate_path_keys(apps, schema_editor):
+    from wiki_test import settings
+
+    URLPath = apps.get_model("wiki", "URLPath")
+    max_length = URLPath._meta.get_field("path_key").max_length
+    keys = {}
+    urlpaths = list(
+        URLPath.objects.order_by("tree_id", "lft").only("id", "parent_id", "slug")
+    )
+    for urlpath in urlpaths:
+        if urlpath.parent_id is None:
+            key = ""
+        else:
+            parent_key = keys.get(urlpath.parent_id)
+            key = None
+            if parent_key is not None:
+                key = "{}/{}".format(parent_key, urlpath.slug or "").strip("/")
+                if not settings.URL_CASE_SENSITIVE:
+                    key = key.lower()
+                if len(key) > max_length:
+                    key = None
+        keys[urlpath.id] = key
+        urlpath.path_key = key
+    URLPath.objects.bulk_update(urlpaths, ["path_key"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0006_articlerevision_plain_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='urlpath',
+            name='path_key',
+            field=models.CharField(blank=True, editable=False, max_length=512, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='urlpath',
+            index=models.Index(fields=['site', 'path_key'], name='wiki_urlpath_path_key_idx'),
+        ),
+        # Added by django-mptt once the model declares Meta.indexes
+        migrations.AddIndex(
+            model_name='urlpath',
+            index=models.Index(fields=['tree_id', 'lft'], name='wiki_urlpath_tree_id_lft_idx'),
+        ),
+        migrations.RunPython(populate_path_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.1.2 on 2026-10-17 16:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sites', '0002_alter_domain_unique'),
+        ('wiki', '0007_urlpath_path_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='URLPathRedirect',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path_key', models.CharField(max_length=512)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('site', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='sites.site')),
+                ('urlpath', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='redirects', to='wiki.urlpath')),
+            ],
+            options={
+                'unique_together': {('site', 'path_key')},
+            },
+        ),
+    ]
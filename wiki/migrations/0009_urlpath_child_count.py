@@ -0,0 +1,33 @@
+# Generated by Django 4.1.2 on 2026-10-17 18:40
+
+from django.db import migrations, models
+
+
+def populate_child_counts(apps, schema_editor):
+    URLPath = apps.get_model("wiki", "URLPath")
+    counts = dict(
+        URLPath.objects.exclude(parent=None)
+        .values_list("parent_id")
+        .annotate(count=models.Count("id"))
+        .order_by()
+    )
+    urlpaths = [
+        URLPath(id=urlpath_id, child_count=count) for urlpath_id, count in counts.items()
+    ]
+    URLPath.objects.bulk_update(urlpaths, ["child_count"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0008_urlpathredirect'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='urlpath',
+            name='child_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_child_counts, migrations.RunPython.noop),
+    ]
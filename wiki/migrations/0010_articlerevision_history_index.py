@@ -0,0 +1,17 @@
+# Generated by Django 4.1.2 on 2026-10-17 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0009_urlpath_child_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='articlerevision',
+            index=models.Index(fields=['article', 'created'], name='wiki_revision_history'),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 4.1.2 on 2026-10-17 20:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+ANONYMOUS, AUTHENTICATED, GROUP, USER = 0, 1, 2, 3
+
+
+def get_grants(ArticleGrant, article, anonymous, anonymous_write):
+    access = {}
+
+    def grant(principal, read, write):
+        if read or write:
+            current = access.get(principal, (False, False))
+            access[principal] = (current[0] or read, current[1] or write)
+
+    grant(
+        (ANONYMOUS, 0),
+        anonymous and article.other_read,
+        anonymous_write and article.other_write,
+    )
+    grant((AUTHENTICATED, 0), article.other_read, article.other_write)
+    if article.group_id:
+        grant((GROUP, article.group_id), article.group_read, article.group_write)
+    if article.owner_id:
+        grant((USER, article.owner_id), True, True)
+    return [
+        ArticleGrant(
+            article_id=article.id,
+            principal_type=principal_type,
+            principal_id=principal_id,
+            can_read=read,
+            can_write=write,
+        )
+        for (principal_type, principal_id), (read, write) in access.items()
+    ]
+
+
+def populate_grants(apps, schema_editor):
+    from wiki_test import settings
+
+    Article = apps.get_model("wiki", "Article")
+    ArticleGrant = apps.get_model("wiki", "ArticleGrant")
+    grants = []
+    for article in Article.objects.only(
+        "owner", "group", "group_read", "group_write", "other_read", "other_write"
+    ).iterator(chunk_size=2000):
+        grants.extend(
+            get_grants(
+                ArticleGrant, article, settings.ANONYMOUS, settings.ANONYMOUS_WRITE
+            )
+        )
+        if len(grants) >= 5000:
+            ArticleGrant.objects.bulk_create(grants)
+            grants = []
+    ArticleGrant.objects.bulk_create(grants)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0010_articlerevision_history_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleGrant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('principal_type', models.PositiveSmallIntegerField(choices=[(0, 'anonymous'), (1, 'authenticated'), (2, 'group'), (3, 'user')])),
+                ('principal_id', models.PositiveIntegerField(default=0)),
+                ('can_read', models.BooleanField(default=False)),
+                ('can_write', models.BooleanField(default=False)),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='grants', to='wiki.article')),
+            ],
+            options={
+                'unique_together': {('article', 'principal_type', 'principal_id')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='articlegrant',
+            index=models.Index(fields=['principal_type', 'principal_id', 'article'], name='wiki_articlegrant_principal'),
+        ),
+        migrations.RunPython(populate_grants, migrations.RunPython.noop),
+    ]
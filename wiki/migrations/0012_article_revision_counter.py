@@ -0,0 +1,34 @@
+# Generated by Django 4.1.2 on 2026-10-17 20:40
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_revision_counters(apps, schema_editor):
+    Article = apps.get_model("wiki", "Article")
+    ArticleRevision = apps.get_model("wiki", "ArticleRevision")
+    latest = (
+        ArticleRevision.objects.filter(article=OuterRef("pk"))
+        .order_by()
+        .values("article")
+        .annotate(latest=Max("revision_number"))
+        .values("latest")
+    )
+    Article.objects.update(revision_counter=Coalesce(Subquery(latest), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0011_articlegrant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='revision_counter',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_revision_counters, migrations.RunPython.noop),
+    ]
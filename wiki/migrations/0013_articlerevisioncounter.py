@@ -0,0 +1,49 @@
+# Generated by Django 4.1.2 on 2026-10-17 23:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def move_counters_out(apps, schema_editor):
+    Article = apps.get_model("wiki", "Article")
+    ArticleRevisionCounter = apps.get_model("wiki", "ArticleRevisionCounter")
+    ArticleRevisionCounter.objects.bulk_create(
+        (
+            ArticleRevisionCounter(article_id=article_id, value=value)
+            for article_id, value in Article.objects.filter(
+                revision_counter__gt=0
+            ).values_list("id", "revision_counter")
+        ),
+        batch_size=2000,
+    )
+
+
+def move_counters_back(apps, schema_editor):
+    Article = apps.get_model("wiki", "Article")
+    ArticleRevisionCounter = apps.get_model("wiki", "ArticleRevisionCounter")
+    for article_id, value in ArticleRevisionCounter.objects.values_list(
+        "article_id", "value"
+    ):
+        Article.objects.filter(id=article_id).update(revision_counter=value)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0012_article_revision_counter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleRevisionCounter',
+            fields=[
+                ('article', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='revision_counter', serialize=False, to='wiki.article')),
+                ('value', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(move_counters_out, move_counters_back),
+        migrations.RemoveField(
+            model_name='article',
+            name='revision_counter',
+        ),
+    ]
@@ -1,12 +1,20 @@
+import uuid
+
 from django.conf import settings as django_settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.core.cache import cache
+from django.db import IntegrityError
 from django.db import models
+from django.db import transaction
+from django.db.models import F
+from django.db.models import Q
 from django.db.models.fields import GenericIPAddressField as IPAddressField
+from django.db.models.signals import post_delete
 from django.db.models.signals import post_save
 from django.db.models.signals import pre_delete
 from django.db.models.signals import pre_save
+from django.template.defaultfilters import striptags
 from django.urls import reverse
 from django.utils import translation
 from django.utils.safestring import mark_safe
@@ -16,7 +24,14 @@ from mptt.models import MPTTModel
 from wiki import queryset
 from wiki_test import settings
 from wiki.functions import permissions
-from wiki.functions.markdown import article_markdown
+from wiki.functions.markdown.blocks import render_by_blocks
+from wiki.functions.markdown import get_fingerprint
+from wiki.functions.markdown import is_user_dependent
+from wiki.functions import locks
+from wiki.functions import prerender
+from wiki.functions import propagate
+from wiki.functions import purge
+from wiki.functions import stats
 from wiki.decorators import disable_signal_for_loaddata
 
 
@@ -75,6 +90,25 @@ class Article(models.Model):
         default=True, verbose_name=_("游客可写入")
     )
 
+    #: The fields access is derived from, see ArticleGrant
+    ACL_FIELDS = (
+        "owner_id",
+        "group_id",
+        "group_read",
+        "group_write",
+        "other_read",
+        "other_write",
+    )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_acl = instance.get_acl()
+        return instance
+
+    def get_acl(self):
+        return tuple(self.__dict__.get(field) for field in self.ACL_FIELDS)
+
     # PERMISSIONS
     def can_read(self, user):
         return permissions.can_read(self, user)
@@ -102,64 +136,95 @@ class Article(models.Model):
     def get_children(self, max_num=None, user_can_read=None, **kwargs):
         cnt = 0
         for obj in self.articleforobject_set.filter(is_mptt=True):
+            objects = (
+                obj.content_object.get_children()
+                .filter(**kwargs)
+                .order_by("articles__article__current_revision__title")
+            )
             if user_can_read:
-                objects = (
-                    obj.content_object.get_children()
-                    .filter(**kwargs)
-                    .can_read(user_can_read)
+                if not permissions.has_custom_read_policy():
+                    objects = objects.can_read(user_can_read)
+                # Also loads the children's articles, a few queries per chunk
+                objects = permissions.iter_readable(
+                    objects,
+                    user_can_read,
+                    chunk_size=max_num + 1 if max_num else 100,
                 )
-            else:
-                objects = obj.content_object.get_children().filter(**kwargs)
-            for child in objects.order_by("articles__article__current_revision__title"):
+            for child in objects:
                 cnt += 1
                 if max_num and cnt > max_num:
                     return
                 yield child
 
-    # All recursive permission methods will use descendant_objects to access
-    # generic relations and check if they are using MPTT and have
-    # INHERIT_PERMISSIONS=True
-    def set_permissions_recursive(self):
-        for descendant in self.descendant_objects():
-            if descendant.INHERIT_PERMISSIONS:
-                descendant.article.group_read = self.group_read
-                descendant.article.group_write = self.group_write
-                descendant.article.other_read = self.other_read
-                descendant.article.other_write = self.other_write
-                descendant.article.save()
-
-    def set_group_recursive(self):
-        for descendant in self.descendant_objects():
-            if descendant.INHERIT_PERMISSIONS:
-                descendant.article.group = self.group
-                descendant.article.save()
-
-    def set_owner_recursive(self):
-        for descendant in self.descendant_objects():
-            if descendant.INHERIT_PERMISSIONS:
-                descendant.article.owner = self.owner
-                descendant.article.save()
+    # The recursive methods update the articles of all descendants that
+    # use MPTT and have INHERIT_PERMISSIONS=True, see wiki.functions.propagate.
+    # They return the number of articles updated.
+    def set_permissions_recursive(self, progress=None):
+        return propagate.propagate(
+            self, propagate.get_values(self, ["permissions"]), progress=progress
+        )
 
-    def add_revision(self, new_revision, save=True):
+    def set_group_recursive(self, progress=None):
+        return propagate.propagate(
+            self, propagate.get_values(self, ["group"]), progress=progress
+        )
+
+    def set_owner_recursive(self, progress=None):
+        return propagate.propagate(
+            self, propagate.get_values(self, ["owner"]), progress=progress
+        )
+
+    def next_revision_number(self):
+        """
+        Increments the article's revision counter and returns it. The UPDATE
+        locks the counter row until the transaction ends, so concurrent
+        editors wait here instead of colliding on the same revision number.
+        """
+        counter = ArticleRevisionCounter.objects.filter(article_id=self.id)
+        if not counter.update(value=F("value") + 1):
+            # The article's first revision
+            ArticleRevisionCounter.objects.get_or_create(article_id=self.id)
+            counter.update(value=F("value") + 1)
+        return counter.values_list("value", flat=True).get()
 
+    def add_revision(self, new_revision, save=True):
+        """
+        Makes new_revision the current revision. The revision gets its
+        number from the counter in on_article_revision_pre_save, and the
+        article row stays locked until the revision and the article are
+        written, in one transaction.
+        """
         assert self.id or save, (
             "抱歉，如果不使用save=True，则无法向尚未保存的文章添加修订"
         )
-        if not self.id:
-            self.save()
-        revisions = self.articlerevision_set.all()
+        new_revision.previous_revision = previous_revision = self.current_revision
+        if not save:
+            new_revision.article = self
+            self.current_revision = new_revision
+            return
         try:
-            new_revision.revision_number = revisions.latest().revision_number + 1
-        except ArticleRevision.DoesNotExist:
-            new_revision.revision_number = 0
-        new_revision.article = self
-        new_revision.previous_revision = self.current_revision
-        if save:
-            new_revision.clean()
-            new_revision.save()
-        self.current_revision = new_revision
-        if save:
-            self.save()
+            with transaction.atomic():
+                if not self.id:
+                    self.save()
+                # Assigned once the article has its id, before that Django
+                # would drop the cached instance and load it again
+                new_revision.article = self
+                # Set before the revision is saved, so that
+                # on_article_revision_post_save does not save the article too
+                self.current_revision = new_revision
+                new_revision.clean()
+                new_revision.save()
+                self.save(update_fields=["current_revision", "modified"])
+        except Exception:
+            self.current_revision = previous_revision
+            raise
+
+    def delete(self, *args, **kwargs):
+        from wiki.models.urlpath import on_article_delete
+
+        # Move the children of this article's paths to lost-and-found first
+        on_article_delete(self)
+        return super().delete(*args, **kwargs)
 
     def add_object_relation(self, obj):
         return ArticleForObject.objects.get_or_create(
@@ -197,53 +262,142 @@ class Article(models.Model):
         else:
             content = self.current_revision.content
         return mark_safe(
-            article_markdown(
+            render_by_blocks(
                 content, self, preview=preview_content is not None, user=user
             )
         )
 
+    def get_cache_generation_key(self):
+        return self.get_cache_generation_key_for_id(self.id)
+
+    @staticmethod
+    def get_cache_generation_key_for_id(article_id):
+        return "wiki-article-generation-{id}".format(id=article_id)
+
+    def get_cache_generation(self):
+        """
+        Returns the article's cache generation. Every cache entry derived from
+        the article is namespaced by it, so replacing the generation
+        invalidates all of them at once.
+        """
+        key = self.get_cache_generation_key()
+        generation = cache.get(key)
+        if generation is None:
+            # Another process may add it at the same time, so read back the
+            # winner instead of trusting our own value.
+            new_generation = uuid.uuid4().hex[:12]
+            cache.add(key, new_generation, None)
+            generation = cache.get(key) or new_generation
+        return generation
+
     def get_cache_key(self):
         """Returns per-article cache key."""
         lang = translation.get_language()
 
-        key_raw = "wiki-article-{id}-{lang}".format(
-            id=self.current_revision.id if self.current_revision else self.id, lang=lang
+        key_raw = "wiki-article-{id}-{lang}-{generation}".format(
+            id=self.current_revision.id if self.current_revision else self.id,
+            lang=lang,
+            generation=self.get_cache_generation(),
         )
         # https://github.com/django-wiki/django-wiki/issues/1065
         return slugify(key_raw, allow_unicode=True)
 
     def get_cache_content_key(self, user=None):
-        """Returns per-article-user cache key."""
+        """Returns the cache key of rendered content. It is shared by all users
+        unless a user is given, see get_cached_content."""
         key_raw = "{key}-{user}".format(
-            key=self.get_cache_key(), user=user.get_username() if user else "-anonymous"
+            key=self.get_cache_key(), user=user.get_username() if user else "-shared"
         )
         # https://github.com/django-wiki/django-wiki/issues/1065
         return slugify(key_raw, allow_unicode=True)
 
     def get_cached_content(self, user=None):
 
-        if user and user.is_anonymous:
+        # Only keep a copy per user if some extension renders per user. The
+        # whole article is then cached per user, not just the parts that
+        # differ, see ArticleMarkdown.is_user_dependent().
+        if user and (user.is_anonymous or not is_user_dependent()):
             user = None
+        counter = "render_cache.user" if user else "render_cache.shared"
 
-        cache_key = self.get_cache_key()
         cache_content_key = self.get_cache_content_key(user)
 
-        cached_items = cache.get(cache_key, [])
-
-        if cache_content_key in cached_items:
-            cached_content = cache.get(cache_content_key)
-            if cached_content is not None:
-                return mark_safe(cached_content)
+        cached_content = cache.get(cache_content_key)
+        if cached_content is not None:
+            stats.incr(counter + ".hit")
+            return mark_safe(cached_content)
+        stats.incr(counter + ".miss")
 
-        cached_content = self.render(user=user)
-        cached_items.append(cache_content_key)
-        cache.set(cache_key, cached_items, settings.CACHE_TIMEOUT)
-        cache.set(cache_content_key, cached_content, settings.CACHE_TIMEOUT)
+        if user is None:
+            cached_content = RenderedRevision.get_html(self.current_revision)
+            stats.incr(
+                "render_store.miss" if cached_content is None else "render_store.hit"
+            )
+        if cached_content is None:
+            cached_content = self._render_single_flight(cache_content_key, user)
+        else:
+            cache.set(cache_content_key, cached_content, settings.CACHE_TIMEOUT)
 
         return mark_safe(cached_content)
 
+    def get_cache_stale_key(self, user=None):
+        """Key of the last rendered content of the article, whatever the revision
+        or cache generation. Served while a new version is being rendered."""
+        key_raw = "wiki-article-stale-{id}-{lang}-{user}".format(
+            id=self.id,
+            lang=translation.get_language(),
+            user=user.get_username() if user else "-shared",
+        )
+        return slugify(key_raw, allow_unicode=True)
+
+    def _render_single_flight(self, cache_content_key, user):
+        stale_key = self.get_cache_stale_key(user)
+        with locks.single_flight(
+            cache_content_key, settings.RENDER_LOCK_TIMEOUT
+        ) as acquired:
+            if not acquired:
+                content = cache.get(stale_key)
+                if content is not None:
+                    stats.incr("render_cache.stale")
+                    return content
+                content = locks.wait_for(cache_content_key, settings.RENDER_LOCK_WAIT)
+                if content is not None:
+                    stats.incr("render_cache.waited")
+                    return content
+                # The renderer is too slow or died, render ourselves
+
+            content = self.render(user=user)
+            # Not if the cache was cleared while rendering, the content may
+            # already be outdated
+            if user is None and self.get_cache_content_key() == cache_content_key:
+                RenderedRevision.store_html(self.current_revision, content)
+            cache.set(cache_content_key, content, settings.CACHE_TIMEOUT)
+            # Outlives generations on purpose, see get_cache_stale_key
+            cache.set(stale_key, content, None)
+            return content
+
     def clear_cache(self):
-        cache.delete(self.get_cache_key())
+        self.clear_cache_for_ids([self.id])
+
+    def clear_ancestor_cache(self):
+        self.clear_cache_for_ids(
+            [ancestor.article_id for ancestor in self.ancestor_objects()]
+        )
+
+    @classmethod
+    def clear_cache_for_ids(cls, article_ids):
+        """Moves the given articles to a new cache generation in one round-trip.
+        Entries of the old generation are never read again and just expire.
+        Their stored renders are deleted, as they may be just as outdated."""
+        article_ids = set(article_ids)
+        cache.set_many(
+            {
+                cls.get_cache_generation_key_for_id(article_id): uuid.uuid4().hex[:12]
+                for article_id in article_ids
+            },
+            None,
+        )
+        RenderedRevision.delete_for_articles(article_ids)
 
     def get_url_kwargs(self):
         urlpaths = self.urlpath_set.all()
@@ -282,6 +436,116 @@ class ArticleForObject(models.Model):
         unique_together = ("content_type", "object_id")
 
 
+class ArticleGrant(models.Model):
+
+    """Who may read or write an article: one row per principal that has
+    access. The rows are derived from the article's owner, group, group_* and
+    other_* fields and the ANONYMOUS settings, and replaced whenever those
+    change, so listings filter by an indexed lookup instead of working out
+    access article by article. Group membership is not stored, a user has
+    the grants of the groups they are in at the time of the query."""
+
+    ANONYMOUS = 0
+    AUTHENTICATED = 1
+    GROUP = 2
+    USER = 3
+    PRINCIPAL_TYPES = (
+        (ANONYMOUS, _("anonymous")),
+        (AUTHENTICATED, _("authenticated")),
+        (GROUP, _("group")),
+        (USER, _("user")),
+    )
+
+    BATCH_SIZE = 1000
+
+    article = models.ForeignKey(
+        Article, on_delete=models.CASCADE, related_name="grants"
+    )
+    principal_type = models.PositiveSmallIntegerField(choices=PRINCIPAL_TYPES)
+    # The group or user id, 0 for anonymous and authenticated
+    principal_id = models.PositiveIntegerField(default=0)
+    can_read = models.BooleanField(default=False)
+    can_write = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ("article", "principal_type", "principal_id")
+        indexes = [
+            models.Index(
+                fields=["principal_type", "principal_id", "article"],
+                name="wiki_articlegrant_principal",
+            )
+        ]
+
+    @classmethod
+    def get_grants(cls, article):
+        """The unsaved grants of an article, from its fields."""
+        owner_id, group_id, group_read, group_write, other_read, other_write = (
+            article.get_acl()
+        )
+        access = {}
+
+        def grant(principal, read, write):
+            if read or write:
+                current = access.get(principal, (False, False))
+                access[principal] = (current[0] or read, current[1] or write)
+
+        grant(
+            (cls.ANONYMOUS, 0),
+            settings.ANONYMOUS and other_read,
+            settings.ANONYMOUS_WRITE and other_write,
+        )
+        grant((cls.AUTHENTICATED, 0), other_read, other_write)
+        if group_id:
+            grant((cls.GROUP, group_id), group_read, group_write)
+        if owner_id:
+            grant((cls.USER, owner_id), True, True)
+        return [
+            cls(
+                article_id=article.id,
+                principal_type=principal_type,
+                principal_id=principal_id,
+                can_read=read,
+                can_write=write,
+            )
+            for (principal_type, principal_id), (read, write) in access.items()
+        ]
+
+    @classmethod
+    def set_for_article(cls, article):
+        cls.objects.filter(article_id=article.id).delete()
+        cls.objects.bulk_create(cls.get_grants(article))
+
+    @classmethod
+    def rebuild(cls, article_ids, progress=None):
+        """Replaces the grants of these articles, reading their current
+        fields. progress is called with (done, total) after each batch."""
+        article_ids = list(article_ids)
+        total = len(article_ids)
+        for start in range(0, total, cls.BATCH_SIZE):
+            batch = article_ids[start:start + cls.BATCH_SIZE]
+            grants = []
+            for article in Article.objects.filter(id__in=batch).only(
+                "owner", "group", "group_read", "group_write", "other_read", "other_write"
+            ):
+                grants.extend(cls.get_grants(article))
+            cls.objects.filter(article_id__in=batch).delete()
+            cls.objects.bulk_create(grants)
+            if progress:
+                progress(min(start + cls.BATCH_SIZE, total), total)
+
+    @classmethod
+    def get_principal_filter(cls, context):
+        """The grants that apply to the user of a PermissionContext."""
+        if context.is_anonymous:
+            return Q(principal_type=cls.ANONYMOUS, principal_id=0)
+        q = Q(principal_type=cls.AUTHENTICATED, principal_id=0) | Q(
+            principal_type=cls.USER, principal_id=context.user_id
+        )
+        if context.group_ids:
+            q |= Q(principal_type=cls.GROUP, principal_id__in=sorted(context.group_ids))
+        return q
+
+
 class BaseRevisionMixin(models.Model):
 
     revision_number = models.IntegerField(
@@ -366,6 +630,9 @@ class ArticleRevision(BaseRevisionMixin, models.Model):
         ),
     )
 
+    # Rendered content without markup, for search snippets. Filled in by the
+    # pre-renderer or on first use, see get_plain_text().
+    plain_text = models.TextField(null=True, blank=True, editable=False)
 
     def __str__(self):
         return "%s (%d)" % (self.title, self.revision_number)
@@ -376,9 +643,28 @@ class ArticleRevision(BaseRevisionMixin, models.Model):
         # have UNIX line endings \n instead.
         self.content = self.content.replace("\r", "").replace("\n", "\r\n")
 
+    @staticmethod
+    def make_plain_text(html):
+        """Tags stripped and whitespace collapsed; entities stay escaped."""
+        return " ".join(striptags(html).split())
+
+    def set_plain_text(self, html):
+        self.plain_text = self.make_plain_text(html)
+        # Not through save(), a revision is not edited by this
+        ArticleRevision.objects.filter(pk=self.pk).update(plain_text=self.plain_text)
+
+    def get_plain_text(self):
+        if self.plain_text is None:
+            html = RenderedRevision.get_html(self)
+            if html is None:
+                html = render_by_blocks(self.content, self.article)
+                RenderedRevision.store_html(self, html)
+            self.set_plain_text(html)
+        return self.plain_text
+
     def inherit_predecessor(self, article):
         predecessor = article.current_revision
-        self.article = predecessor.article
+        self.article = article
         self.content = predecessor.content
         self.title = predecessor.title
         self.deleted = predecessor.deleted
@@ -388,28 +674,158 @@ class ArticleRevision(BaseRevisionMixin, models.Model):
         get_latest_by = "revision_number"
         ordering = ("created",)
         unique_together = ("article", "revision_number")
+        indexes = [
+            # History pages by (created, id) within an article
+            models.Index(fields=["article", "created"], name="wiki_revision_history"),
+        ]
+
+
+class ArticleRevisionCounter(models.Model):
+
+    """The last revision number handed out for an article, only written by
+    Article.next_revision_number(). It is not a field of Article, so that
+    saving an article loaded before a concurrent edit cannot turn it
+    back."""
+
+    article = models.OneToOneField(
+        Article,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="revision_counter",
+    )
+    value = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return "%s (%d)" % (self.article, self.value)
+
+
+class RenderedRevision(models.Model):
+
+    """Rendered HTML of a revision, for a markdown configuration (the
+    fingerprint) and language. The HTML also depends on other articles and
+    plugins, so Article.clear_cache_for_ids() deletes the entries of the
+    articles whose cache it clears."""
+
+    revision = models.ForeignKey(
+        "ArticleRevision",
+        on_delete=models.CASCADE,
+        related_name="renders",
+        verbose_name=_("修订"),
+    )
+    fingerprint = models.CharField(max_length=40, editable=False)
+    language = models.CharField(max_length=15, editable=False)
+    html = models.TextField(blank=True, editable=False)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return "%s (%s)" % (self.revision, self.language)
+
+    @classmethod
+    def get_html(cls, revision):
+        if not settings.RENDER_STORE or not revision:
+            return None
+        return (
+            cls.objects.filter(
+                revision=revision,
+                fingerprint=get_fingerprint(),
+                language=translation.get_language() or "",
+            )
+            .values_list("html", flat=True)
+            .first()
+        )
+
+    @classmethod
+    def store_html(cls, revision, html):
+        if not settings.RENDER_STORE or not revision:
+            return
+        try:
+            # Concurrent renders of the same revision may both try to store
+            with transaction.atomic():
+                cls.objects.get_or_create(
+                    revision=revision,
+                    fingerprint=get_fingerprint(),
+                    language=translation.get_language() or "",
+                    defaults={"html": html},
+                )
+        except IntegrityError:
+            pass
+
+    @classmethod
+    def delete_for_articles(cls, article_ids, batch_size=500):
+        if not settings.RENDER_STORE:
+            return
+        article_ids = list(article_ids)
+        for start in range(0, len(article_ids), batch_size):
+            cls.objects.filter(
+                revision__article_id__in=article_ids[start:start + batch_size]
+            ).delete()
+
+    class Meta:
+        verbose_name = _("rendered revision")
+        verbose_name_plural = _("rendered revisions")
+        unique_together = ("revision", "fingerprint", "language")
 
 
 ######################################################
 # SIGNAL HANDLERS
 ######################################################
 
-# clear the ancestor cache when saving or deleting articles so things like
-# article_lists will be refreshed
-def _clear_ancestor_cache(article):
-    for ancestor in article.ancestor_objects():
-        ancestor.article.clear_cache()
-
-
 @disable_signal_for_loaddata
 def on_article_save_clear_cache(instance, **kwargs):
     on_article_delete_clear_cache(instance, **kwargs)
 
 
+# clear the ancestor cache when saving or deleting articles so things like
+# article_lists will be refreshed. One round-trip for the whole chain.
 @disable_signal_for_loaddata
 def on_article_delete_clear_cache(instance, **kwargs):
-    _clear_ancestor_cache(instance)
-    instance.clear_cache()
+    if purge.is_purging():
+        # Invalidated once for the whole subtree
+        return
+    Article.clear_cache_for_ids(
+        [instance.id]
+        + [ancestor.article_id for ancestor in instance.ancestor_objects()]
+    )
+
+
+@disable_signal_for_loaddata
+def on_article_save_update_grants(instance, created, update_fields=None, **kwargs):
+    acl = instance.get_acl()
+    loaded = getattr(instance, "_loaded_acl", None)
+    partial = update_fields is not None and not created
+    if partial:
+        written = {Article._meta.get_field(name).attname for name in update_fields}
+        if written.isdisjoint(Article.ACL_FIELDS):
+            return
+        if loaded is not None:
+            # The other fields kept their loaded values in the row, whatever
+            # the instance holds now
+            acl = tuple(
+                value if field in written else old
+                for field, value, old in zip(Article.ACL_FIELDS, acl, loaded)
+            )
+    if not created and acl == loaded:
+        return
+    if not partial and all(field in instance.__dict__ for field in Article.ACL_FIELDS):
+        ArticleGrant.set_for_article(instance)
+    else:
+        # Some of the fields were deferred or not written, the row has them
+        ArticleGrant.rebuild([instance.id])
+    instance._loaded_acl = None if partial and loaded is None else acl
+
+
+# Deleting a group or user sets the articles' fields to NULL without saving
+# them, the grants have to go separately.
+def on_group_delete_remove_grants(instance, **kwargs):
+    ArticleGrant.objects.filter(
+        principal_type=ArticleGrant.GROUP, principal_id=instance.pk
+    ).delete()
+
+
+def on_user_delete_remove_grants(instance, **kwargs):
+    ArticleGrant.objects.filter(
+        principal_type=ArticleGrant.USER, principal_id=instance.pk
+    ).delete()
 
 
 @disable_signal_for_loaddata
@@ -425,12 +841,11 @@ def on_article_revision_pre_save(**kwargs):
         if revision_changed:
             instance.previous_revision = instance.article.current_revision
 
-    if not instance.revision_number:
-        try:
-            previous_revision = instance.article.articlerevision_set.latest()
-            instance.revision_number = previous_revision.revision_number + 1
-        except ArticleRevision.DoesNotExist:
-            instance.revision_number = 1
+    if instance._state.adding:
+        # Always from the counter, a number guessed from the latest revision
+        # (or by inherit_predecessor) may be taken by a concurrent edit
+        with transaction.atomic(savepoint=False):
+            instance.revision_number = instance.article.next_revision_number()
 
 
 @disable_signal_for_loaddata
@@ -444,7 +859,18 @@ def on_article_revision_post_save(**kwargs):
         instance.article.save()
 
 
+@disable_signal_for_loaddata
+def on_article_revision_post_save_prerender(**kwargs):
+    if kwargs.get("created", False):
+        revision_id = kwargs["instance"].id
+        transaction.on_commit(lambda: prerender.enqueue(revision_id))
+
+
 pre_save.connect(on_article_revision_pre_save, ArticleRevision)
 post_save.connect(on_article_revision_post_save, ArticleRevision)
+post_save.connect(on_article_revision_post_save_prerender, ArticleRevision)
 post_save.connect(on_article_save_clear_cache, Article)
+post_save.connect(on_article_save_update_grants, Article)
+post_delete.connect(on_group_delete_remove_grants, settings.GROUP_MODEL)
+post_delete.connect(on_user_delete_remove_grants, django_settings.AUTH_USER_MODEL)
 pre_delete.connect(on_article_delete_clear_cache, Article)
@@ -4,6 +4,7 @@ from django.db.models import signals
 from django.utils.translation import gettext_lazy as _
 from wiki.decorators import disable_signal_for_loaddata
 
+from .article import Article
 from .article import ArticleRevision
 from .article import BaseRevisionMixin
 
@@ -255,8 +256,9 @@ def on_revision_plugin_revision_pre_save(**kwargs):
 @disable_signal_for_loaddata
 def on_reusable_plugin_post_save(**kwargs):
     reusableplugin = kwargs["instance"]
-    for article in reusableplugin.articles.all():
-        article.clear_cache()
+    Article.clear_cache_for_ids(
+        reusableplugin.articles.values_list("id", flat=True)
+    )
 
 
 signals.post_save.connect(update_simple_plugins, ArticleRevision)
@@ -4,9 +4,14 @@ import warnings
 from django.contrib.contenttypes.fields import GenericRelation
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models import Site
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.db import transaction
+from django.db.models.functions import Concat
+from django.db.models.functions import Length
+from django.db.models.functions import Substr
+from django.db.models.signals import post_delete
 from django.db.models.signals import post_save
 from django.db.models.signals import pre_delete
 from django.urls import reverse
@@ -16,6 +21,8 @@ from wiki import queryset
 from wiki_test import settings
 from wiki.functions.exceptions import MultipleRootURLs
 from wiki.functions.exceptions import NoRootURL
+from wiki.functions import purge
+from wiki.functions import tree
 from wiki.decorators import disable_signal_for_loaddata
 from wiki.models.article import Article
 from wiki.models.article import ArticleForObject
@@ -67,31 +74,65 @@ class URLPath(MPTTModel):
         related_name="moved_from",
     )
 
+    PATH_KEY_MAX_LENGTH = 512
+
+    # The normalized path without slashes ("" for the root), so that a path
+    # resolves with one indexed lookup. NULL if the path is too long, such
+    # paths are resolved slug by slug.
+    path_key = models.CharField(
+        max_length=PATH_KEY_MAX_LENGTH,
+        null=True,
+        blank=True,
+        editable=False,
+    )
+
+    # Number of children, so that a tree can show which nodes expand
+    # without counting them.
+    child_count = models.PositiveIntegerField(default=0, editable=False)
+
     def __cached_ancestors(self):
-        if not self.pk or not self.get_ancestors().exists():
-            self._cached_ancestors = []
         if not hasattr(self, "_cached_ancestors"):
-            self._cached_ancestors = list(self.get_ancestors().select_related_common())
+            if not self.pk or not self.parent_id:
+                self.cached_ancestors = []
+            else:
+                self.cached_ancestors = list(
+                    self.get_ancestors().select_related_common()
+                )
 
         return self._cached_ancestors
 
     def __cached_ancestors_setter(self, ancestors):
+        # Ancestors come root first, so every ancestor's own ancestors are the
+        # ones before it. Hand them on, breadcrumbs ask each one for its path.
         self._cached_ancestors = ancestors
+        for index, ancestor in enumerate(ancestors):
+            if not hasattr(ancestor, "_cached_ancestors"):
+                ancestor._cached_ancestors = ancestors[:index]
+        parent_field = self._meta.get_field("parent")
+        if ancestors and parent_field.is_cached(self):
+            parent = self.parent
+            if parent is not None and not hasattr(parent, "_cached_ancestors"):
+                parent._cached_ancestors = ancestors[:-1]
 
     # Python 2.5 compatible property constructor
     cached_ancestors = property(__cached_ancestors, __cached_ancestors_setter)
 
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        # The row may have moved
+        self.__dict__.pop("_cached_ancestors", None)
+
     def set_cached_ancestors_from_parent(self, parent):
         self.cached_ancestors = parent.cached_ancestors + [parent]
 
     @property
     def path(self):
-        if not self.parent:
+        if not self.parent_id:
             return ""
 
         # All ancestors except roots
         ancestors = list(
-            filter(lambda ancestor: ancestor.parent is not None, self.cached_ancestors)
+            filter(lambda ancestor: ancestor.parent_id is not None, self.cached_ancestors)
         )
         slugs = [obj.slug if obj.slug else "" for obj in ancestors + [self]]
 
@@ -107,14 +148,12 @@ class URLPath(MPTTModel):
                 return ancestor
         return None
 
-    @transaction.atomic
-    def _delete_subtree(self):
-        for descendant in self.get_descendants(include_self=True).order_by("-level"):
-            descendant.article.delete()
+    def _delete_subtree(self, progress=None):
+        return purge.purge_subtree(self, progress=progress)
 
-    def delete_subtree(self):
+    def delete_subtree(self, progress=None):
 
-        self._delete_subtree()
+        return self._delete_subtree(progress=progress)
 
     @classmethod
     def root(cls):
@@ -140,12 +179,206 @@ class URLPath(MPTTModel):
         assert not (
                 self.parent and self.get_children()
         ), "不能删除包含子项的根项目。"
-        super().delete(*args, **kwargs)
+        parent_id = self.parent_id
+        result = super().delete(*args, **kwargs)
+        self.add_child_count(parent_id, -1)
+        return result
 
     class Meta:
         verbose_name = ("URL path")
         verbose_name_plural = ("URL paths")
         unique_together = ("site", "parent", "slug")
+        indexes = [
+            models.Index(fields=["site", "path_key"], name="wiki_urlpath_path_key_idx")
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_path_key = instance.__dict__.get("path_key")
+        instance._loaded_parent_id = instance.__dict__.get("parent_id")
+        return instance
+
+    @staticmethod
+    def normalize_path_key(path):
+        key = path.strip("/")
+        if not settings.URL_CASE_SENSITIVE:
+            key = key.lower()
+        return key
+
+    @classmethod
+    def join_path_key(cls, parent_key, slug):
+        if parent_key is None:
+            return None
+        key = cls.normalize_path_key(
+            "{}/{}".format(parent_key, slug or "") if parent_key else slug or ""
+        )
+        return key if len(key) <= cls.PATH_KEY_MAX_LENGTH else None
+
+    def get_path_key(self):
+        if not self.parent_id:
+            return ""
+        return self.join_path_key(self.parent.path_key, self.slug)
+
+    @classmethod
+    def add_child_count(cls, urlpath_id, delta):
+        if urlpath_id:
+            cls.objects.filter(id=urlpath_id).update(
+                child_count=models.F("child_count") + delta
+            )
+
+    def save(self, *args, **kwargs):
+        self.path_key = self.get_path_key()
+        if self._state.adding:
+            loaded_parent_id = None
+        else:
+            loaded_parent_id = getattr(self, "_loaded_parent_id", self.parent_id)
+        super().save(*args, **kwargs)
+        self._loaded_parent_id = self.parent_id
+        if loaded_parent_id != self.parent_id:
+            self.add_child_count(loaded_parent_id, -1)
+            self.add_child_count(self.parent_id, 1)
+        loaded_path_key = getattr(self, "_loaded_path_key", self.path_key)
+        self._loaded_path_key = self.path_key
+        if loaded_path_key != self.path_key:
+            # Moved or renamed, so are all the descendants
+            self.update_descendant_path_keys(loaded_path_key)
+
+    def update_descendant_path_keys(self, old_path_key=None):
+        if self.swap_path_key_prefix(self.get_descendants(), old_path_key, self.path_key):
+            return
+        keys = {self.id: self.path_key}
+        descendants = list(
+            self.get_descendants().only("id", "parent_id", "slug", "path_key")
+        )
+        for descendant in descendants:
+            descendant.path_key = self.join_path_key(
+                keys[descendant.parent_id], descendant.slug
+            )
+            keys[descendant.id] = descendant.path_key
+        URLPath.objects.bulk_update(descendants, ["path_key"], batch_size=500)
+
+    @staticmethod
+    def swap_path_key_prefix(queryset, old_prefix, new_prefix):
+        """
+        Replaces old_prefix by new_prefix in the path keys of queryset with
+        one UPDATE. Returns False without changing anything if a key is
+        missing or would get too long.
+        """
+        if not old_prefix or new_prefix is None:
+            return False
+        # Keys below the root have no leading slash
+        start = len(old_prefix) + (1 if new_prefix else 2)
+        unfit = models.Q(path_key=None)
+        growth = len(new_prefix) - start + 1
+        if growth > 0:
+            unfit |= models.Q(key_length__gt=URLPath.PATH_KEY_MAX_LENGTH - growth)
+        if queryset.annotate(key_length=Length("path_key")).filter(unfit).exists():
+            return False
+        queryset.update(
+            path_key=Concat(models.Value(new_prefix), Substr("path_key", start))
+        )
+        return True
+
+    @transaction.atomic
+    def move_children(self, target):
+        """
+        Moves all children of this node with their subtrees behind the
+        children of target, shifting each affected range of the tree once
+        instead of once per child. Slugs that are taken under target get the
+        id of the child appended.
+        """
+        fields = ("tree_id", "lft", "rght", "level", "path_key")
+        node = URLPath.objects.select_for_update().values(*fields).get(pk=self.pk)
+        dest = URLPath.objects.select_for_update().values(*fields).get(pk=target.pk)
+        children = list(URLPath.objects.filter(parent_id=self.pk).values_list("id", "slug"))
+        if not children:
+            return
+        if node["tree_id"] != dest["tree_id"] or node["lft"] <= dest["lft"] <= node["rght"]:
+            for child in URLPath.objects.filter(parent_id=self.pk):
+                child.move_to(target)
+            return
+
+        taken = {
+            (slug or "").lower()
+            for slug in URLPath.objects.filter(parent_id=target.pk).values_list(
+                "slug", flat=True
+            )
+        }
+        renamed = []
+        for child_id, slug in children:
+            if (slug or "").lower() in taken:
+                suffix = "-%d" % child_id
+                slug = (slug or "")[: self.SLUG_MAX_LENGTH - len(suffix)] + suffix
+                URLPath.objects.filter(id=child_id).update(slug=slug)
+                renamed.append(child_id)
+
+        # The children fill [first, last]. Going right, the nodes between
+        # them and target's rght move left by their width; going left, the
+        # nodes from target's rght up to them move right.
+        first, last = node["lft"] + 1, node["rght"] - 1
+        width = last - first + 1
+        position = dest["rght"]
+        if position > last:
+            offset, low, high, shift = position - last - 1, last + 1, position - 1, -width
+        else:
+            offset, low, high, shift = position - first, position, first - 1, width
+
+        def plus(field, value):
+            return models.ExpressionWrapper(
+                models.F(field) + value, output_field=models.PositiveIntegerField()
+            )
+
+        def shifted(field):
+            return models.Case(
+                models.When(**{field + "__range": (first, last)}, then=plus(field, offset)),
+                models.When(**{field + "__range": (low, high)}, then=plus(field, shift)),
+                default=models.F(field),
+            )
+
+        span = (min(first, low), max(last, high))
+        # MySQL assigns left to right and later expressions see the new
+        # values, so lft, which the level condition reads, comes last.
+        URLPath.objects.filter(
+            models.Q(lft__range=span) | models.Q(rght__range=span),
+            tree_id=node["tree_id"],
+        ).update(
+            parent=models.Case(
+                models.When(
+                    parent_id=self.pk,
+                    then=models.Value(target.pk, output_field=self._meta.pk),
+                ),
+                default=models.F("parent"),
+            ),
+            level=models.Case(
+                models.When(
+                    lft__range=(first, last),
+                    then=plus("level", dest["level"] - node["level"]),
+                ),
+                default=models.F("level"),
+            ),
+            rght=shifted("rght"),
+            lft=shifted("lft"),
+        )
+
+        moved = URLPath.objects.filter(
+            tree_id=node["tree_id"], lft__range=(first + offset, last + offset)
+        )
+        if self.swap_path_key_prefix(moved, node["path_key"], dest["path_key"]):
+            stale = renamed
+        else:
+            stale = [child_id for child_id, _ in children]
+        for child in URLPath.objects.filter(id__in=stale).select_related("parent"):
+            old_path_key = child.path_key
+            child.path_key = child.get_path_key()
+            URLPath.objects.filter(id=child.id).update(path_key=child.path_key)
+            child.update_descendant_path_keys(old_path_key)
+
+        URLPath.objects.filter(id=self.pk).update(child_count=0)
+        self.add_child_count(target.pk, len(children))
+        for instance in (self, target):
+            instance.refresh_from_db(fields=["lft", "rght", "level", "child_count"])
+        tree.record_change(urlpath_ids=[child_id for child_id, _ in children])
 
     def clean(self, *args, **kwargs):
         if self.slug and not self.parent:
@@ -170,6 +403,34 @@ class URLPath(MPTTModel):
         if not path:
             return cls.root()
 
+        if settings.TREE_SNAPSHOT:
+            urlpath = cls._get_by_path_from_snapshot(path)
+            if urlpath is not None:
+                return urlpath
+
+        path_key = cls.normalize_path_key(path)
+        if len(path_key) <= cls.PATH_KEY_MAX_LENGTH:
+            try:
+                urlpath = (
+                    cls.objects.filter(
+                        site=Site.objects.get_current(), path_key=path_key
+                    )
+                    .select_related_common()
+                    .get()
+                )
+            except cls.DoesNotExist:
+                # Raises NoRootURL if that is why
+                cls.root()
+                raise
+            except cls.MultipleObjectsReturned:
+                # Slugs that only differ in case, resolve them one by one
+                pass
+            else:
+                urlpath.cached_ancestors = list(
+                    urlpath.get_ancestors().select_related_common()
+                )
+                return urlpath
+
         slugs = path.split("/")
         level = 1
         parent = cls.root()
@@ -188,6 +449,39 @@ class URLPath(MPTTModel):
 
         return parent
 
+    @classmethod
+    def _get_by_path_from_snapshot(cls, path):
+        """
+        Looks the path up in the tree snapshot and fetches the URLPath with
+        all its ancestors in one query. Returns None if the path is not in
+        the snapshot or the rows no longer match it.
+        """
+        snapshot = tree.get_snapshot()
+        urlpath_id = snapshot.resolve(path)
+        if urlpath_id is None:
+            return None
+        ids = snapshot.get_ancestor_ids(urlpath_id) + [urlpath_id]
+        nodes = {
+            node.id: node
+            for node in cls.objects.filter(
+                id__in=ids, site_id=snapshot.site_id
+            ).select_related_common()
+        }
+        if len(nodes) != len(ids):
+            return None
+        chain = [nodes[node_id] for node_id in ids]
+        parent_id = None
+        for node in chain:
+            if node.parent_id != parent_id:
+                return None
+            parent_id = node.id
+        slugs = "/".join(node.slug or "" for node in chain[1:])
+        if cls.normalize_path_key(slugs) != cls.normalize_path_key(path):
+            return None
+        urlpath = chain[-1]
+        urlpath.cached_ancestors = chain[:-1]
+        return urlpath
+
     def get_absolute_url(self):
         return reverse("wiki:get", kwargs={"path": self.path})
 
@@ -202,7 +496,6 @@ class URLPath(MPTTModel):
             if request:
                 revision.set_from_request(request)
             article.add_revision(revision, save=True)
-            article.save()
             root = cls.objects.create(site=site, article=article)
             article.add_object_relation(root)
         else:
@@ -226,7 +519,6 @@ class URLPath(MPTTModel):
             site = Site.objects.get_current()
         article = Article(**article_kwargs)
         article.add_revision(ArticleRevision(title=title, **revision_kwargs), save=True)
-        article.save()
         newpath = cls.objects.create(
             site=site, parent=parent, slug=slug, article=article
         )
@@ -276,6 +568,75 @@ class URLPath(MPTTModel):
         return self.children.order_by("slug")
 
 
+class URLPathRedirect(models.Model):
+
+    """
+    An old path of a moved URLPath. Looked up when a path does not resolve,
+    so that links to the old location keep working.
+    """
+
+    site = models.ForeignKey(Site, on_delete=models.CASCADE)
+    path_key = models.CharField(max_length=URLPath.PATH_KEY_MAX_LENGTH)
+    urlpath = models.ForeignKey(
+        URLPath,
+        on_delete=models.CASCADE,
+        related_name="redirects",
+    )
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("site", "path_key")
+
+    def __str__(self):
+        return "{} -> {}".format(self.path_key, self.urlpath_id)
+
+    @classmethod
+    def get_target(cls, path):
+        """The URLPath that used to be at path, or None."""
+        path_key = URLPath.normalize_path_key(path)
+        if len(path_key) > URLPath.PATH_KEY_MAX_LENGTH:
+            return None
+        redirect = (
+            cls.objects.filter(site=Site.objects.get_current(), path_key=path_key)
+            .select_related("urlpath")
+            .first()
+        )
+        return redirect.urlpath if redirect else None
+
+    @classmethod
+    @transaction.atomic
+    def create_for_move(cls, urlpath, old_path):
+        """
+        Points the old paths of urlpath and all its descendants at their
+        new location. Returns the number of redirects.
+        """
+        old_key = URLPath.normalize_path_key(old_path)
+        new_key = urlpath.path_key
+        if not old_key or not new_key:
+            return 0
+        descendants = (
+            urlpath.get_descendants(include_self=True)
+            .exclude(path_key=None)
+            .values_list("id", "path_key")
+        )
+        redirects = []
+        new_keys = []
+        for urlpath_id, path_key in descendants:
+            new_keys.append(path_key)
+            path_key = old_key + path_key[len(new_key):]
+            if len(path_key) <= URLPath.PATH_KEY_MAX_LENGTH:
+                redirects.append(
+                    cls(site_id=urlpath.site_id, path_key=path_key, urlpath_id=urlpath_id)
+                )
+        # Paths that are taken again need no redirect, and old ones that
+        # are reused now point to the new location.
+        taken = cls.objects.filter(site_id=urlpath.site_id)
+        taken.filter(path_key__in=new_keys).delete()
+        taken.filter(path_key__in=[redirect.path_key for redirect in redirects]).delete()
+        cls.objects.bulk_create(redirects, batch_size=500)
+        return len(redirects)
+
+
 ######################################################
 # SIGNAL HANDLERS
 ######################################################
@@ -292,60 +653,81 @@ def on_article_relation_save(**kwargs):
         urlpath_content_type = ContentType.objects.get_for_model(URLPath)
     if instance.content_type == urlpath_content_type:
         URLPath.objects.filter(id=instance.object_id).update(article=instance.article)
+        tree.record_change(urlpath_ids=[instance.object_id])
 
 
 post_save.connect(on_article_relation_save, ArticleForObject)
 
 
-class Namespace:
-    # An instance of Namespace simulates "nonlocal variable_name" declaration
-    # in any nested function, that is possible in Python 3. It allows assigning
-    # to non local variable without rebinding it local. See PEP 3104.
-    pass
+@disable_signal_for_loaddata
+def on_urlpath_change_update_tree(instance, **kwargs):
+    if purge.is_purging():
+        return
+    tree.record_change(urlpath_ids=[instance.id])
+
+
+post_save.connect(on_urlpath_change_update_tree, URLPath)
+post_delete.connect(on_urlpath_change_update_tree, URLPath)
+
+
+def get_lost_and_found(site):
+    """The lost-and-found URLPath of the site, created if missing."""
+    cache_key = "wiki-lost-and-found-%d" % site.id
+    lost_and_found_id = cache.get(cache_key)
+    if lost_and_found_id is not None:
+        lost_and_found = URLPath.objects.filter(
+            id=lost_and_found_id, site=site, slug=settings.LOST_AND_FOUND_SLUG
+        ).first()
+        if lost_and_found is not None:
+            return lost_and_found
+    try:
+        lost_and_found = URLPath.objects.get(
+            slug=settings.LOST_AND_FOUND_SLUG, parent=URLPath.root(), site=site
+        )
+    except URLPath.DoesNotExist:
+        article = Article(
+            group_read=True, group_write=False, other_read=False, other_write=False
+        )
+        article.add_revision(
+            ArticleRevision(
+                content=(
+                    "文章丢失了父项目\n"
+                    "===============================\n\n"
+                    "这篇文章的子项目的父项目被删除了。你应该为他们找一个新的父项目。"
+                ),
+                title=("页面丢失了"),
+            )
+        )
+        lost_and_found = URLPath.objects.create(
+            slug=settings.LOST_AND_FOUND_SLUG,
+            parent=URLPath.root(),
+            site=site,
+            article=article,
+        )
+        article.add_object_relation(lost_and_found)
+    cache.set(cache_key, lost_and_found.id, None)
+    return lost_and_found
 
 
+# Called by Article.delete(): Django collects the rows a delete cascades to
+# before it sends pre_delete, so a signal handler would move the children only
+# after they had been scheduled for deletion.
 def on_article_delete(instance, *args, **kwargs):
+    if purge.is_purging():
+        # The children are purged as well
+        return
 
     site = Site.objects.get_current()
 
-    ns = Namespace()
-    ns.lost_and_found = None
-
-    def get_lost_and_found():
-        if ns.lost_and_found:
-            return ns.lost_and_found
-        try:
-            ns.lost_and_found = URLPath.objects.get(
-                slug=settings.LOST_AND_FOUND_SLUG, parent=URLPath.root(), site=site
-            )
-        except URLPath.DoesNotExist:
-            article = Article(
-                group_read=True, group_write=False, other_read=False, other_write=False
-            )
-            article.add_revision(
-                ArticleRevision(
-                    content=(
-                        "文章丢失了父项目\n"
-                        "===============================\n\n"
-                        "这篇文章的子项目的父项目被删除了。你应该为他们找一个新的父项目。"
-                    ),
-                    title=("页面丢失了"),
-                )
-            )
-            ns.lost_and_found = URLPath.objects.create(
-                slug=settings.LOST_AND_FOUND_SLUG,
-                parent=URLPath.root(),
-                site=site,
-                article=article,
-            )
-            article.add_object_relation(ns.lost_and_found)
-        return ns.lost_and_found
-
     for urlpath in URLPath.objects.filter(articles__article=instance, site=site):
-        # Delete the children
-        for child in urlpath.get_children():
-            child.move_to(get_lost_and_found())
-        # ...and finally delete the path itself
-
+        if not urlpath.is_leaf_node():
+            lost_and_found = get_lost_and_found(site)
+            if lost_and_found.id == urlpath.id:
+                # Lost-and-found itself is deleted, keep its children at the top
+                target = URLPath.root()
+            else:
+                target = lost_and_found
+            urlpath.move_children(target)
+        # ...and finally delete the path itself, closing its gap in the tree
+        urlpath.delete()
 
-pre_delete.connect(on_article_delete, Article)
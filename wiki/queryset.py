@@ -1,37 +1,42 @@
 from django.db import models
-from django.db.models import Count
 from django.db.models import Q
 from django.db.models.query import EmptyQuerySet
 from django.db.models.query import QuerySet
 from mptt.managers import TreeManager
+from wiki.functions import permissions
+
+
+def grant_filter(context, access, article="pk"):
+    """
+    A filter for the articles, or the rows pointing to an article through
+    the field article, that the user of a PermissionContext may read or
+    write (access "read" or "write"): article IN the article ids of the
+    matching ArticleGrant rows, read from its (principal, article) index. A
+    correlated EXISTS measured slower.
+    """
+    from wiki.models import ArticleGrant
+
+    return Q(
+        **{
+            article + "__in": ArticleGrant.objects.filter(
+                ArticleGrant.get_principal_filter(context), **{"can_" + access: True}
+            ).values("article_id")
+        }
+    )
 
 
 class ArticleQuerySet(QuerySet):
     def can_read(self, user):
-        if user.has_perm("wiki.moderator"):
+        context = permissions.get_context(user)
+        if context.can_moderate:
             return self
-        if user.is_anonymous:
-            q = self.filter(other_read=True)
-        else:
-            q = self.filter(
-                Q(other_read=True)
-                | Q(owner=user)
-                | (Q(group__user=user) & Q(group_read=True))
-            ).annotate(Count("id"))
-        return q
+        return self.filter(grant_filter(context, "read"))
 
     def can_write(self, user):
-        if user.has_perm("wiki.moderator"):
+        context = permissions.get_context(user)
+        if context.can_moderate:
             return self
-        if user.is_anonymous:
-            q = self.filter(other_write=True)
-        else:
-            q = self.filter(
-                Q(other_write=True)
-                | Q(owner=user)
-                | (Q(group__user=user) & Q(group_write=True))
-            )
-        return q
+        return self.filter(grant_filter(context, "write"))
 
     def active(self):
         return self.filter(current_revision__deleted=False)
@@ -50,32 +55,16 @@ class ArticleEmptyQuerySet(EmptyQuerySet):
 
 class ArticleFkQuerySetMixin:
     def can_read(self, user):
-        if user.has_perm("wiki.moderate"):
+        context = permissions.get_context(user)
+        if context.can_moderate:
             return self
-        if user.is_anonymous:
-            q = self.filter(article__other_read=True)
-        else:
-            # https://github.com/django-wiki/django-wiki/issues/67
-            q = self.filter(
-                Q(article__other_read=True)
-                | Q(article__owner=user)
-                | (Q(article__group__user=user) & Q(article__group_read=True))
-            ).annotate(Count("id"))
-        return q
+        return self.filter(grant_filter(context, "read", article="article"))
 
     def can_write(self, user):
-        if user.has_perm("wiki.moderate"):
+        context = permissions.get_context(user)
+        if context.can_moderate:
             return self
-        if user.is_anonymous:
-            q = self.filter(article__other_write=True)
-        else:
-            # https://github.com/django-wiki/django-wiki/issues/67
-            q = self.filter(
-                Q(article__other_write=True)
-                | Q(article__owner=user)
-                | (Q(article__group__user=user) & Q(article__group_write=True))
-            ).annotate(Count("id"))
-        return q
+        return self.filter(grant_filter(context, "write", article="article"))
 
     def active(self):
         return self.filter(article__current_revision__deleted=False)
@@ -163,7 +152,7 @@ class URLPathManager(TreeManager):
         )
 
     def select_related_common(self):
-        return self.get_queryset().common_select_related()
+        return self.get_queryset().select_related_common()
 
     def active(self):
         return self.get_queryset().active()
@@ -11,7 +11,7 @@ class WikiSite:
     """ 站点配置"""
 
     def __init__(self, name="wiki"):
-        from wiki.views import accounts, article, deleted_list
+        from wiki.views import accounts, article, deleted_list, stats
 
         self.name = name
 
@@ -42,6 +42,9 @@ class WikiSite:
         self.article_preview_view = getattr(
             self, "article_preview_view", article.Preview.as_view()
         )
+        self.article_preview_blocks_view = getattr(
+            self, "article_preview_blocks_view", article.PreviewBlocks.as_view()
+        )
         self.article_history_view = getattr(
             self, "article_history_view", article.History.as_view()
         )
@@ -65,6 +68,7 @@ class WikiSite:
         )
 
         self.search_view = getattr(self, "search_view", article.SearchView.as_view())
+        self.tree_view = getattr(self, "tree_view", article.TreeView.as_view())
         self.article_diff_view = getattr(
             self, "article_diff_view", article.DiffView.as_view()
         )
@@ -82,6 +86,9 @@ class WikiSite:
             self, "deleted_list_view", deleted_list.DeletedListView.as_view()
         )
 
+        # monitoring
+        self.stats_view = getattr(self, "stats_view", stats.StatsView.as_view())
+
     def get_urls(self):
         urlpatterns = self.get_root_urls()
         urlpatterns += self.get_accounts_urls()
@@ -105,6 +112,7 @@ class WikiSite:
             re_path(r"^create-root/$", self.root_view, name="root_create"),
             re_path(r"^missing-root/$", self.root_missing_view, name="root_missing"),
             re_path(r"^_search/$", self.search_view, name="search"),
+            re_path(r"^_tree/$", self.tree_view, name="tree"),
             re_path(
                 r"^_revision/diff/(?P<revision_id>[0-9]+)/$",
                 self.article_diff_view,
@@ -116,6 +124,7 @@ class WikiSite:
     def get_deleted_list_urls(self):
         urlpatterns = [
             re_path("^_admin/$", self.deleted_list_view, name="deleted_list"),
+            re_path("^_admin/stats/$", self.stats_view, name="stats"),
         ]
         return urlpatterns
 
@@ -164,6 +173,11 @@ class WikiSite:
             re_path(r"^edit/$", self.article_edit_view, name="edit"),
             re_path(r"^move/$", self.article_move_view, name="move"),
             re_path(r"^preview/$", self.article_preview_view, name="preview"),
+            re_path(
+                r"^preview/blocks/$",
+                self.article_preview_blocks_view,
+                name="preview_blocks",
+            ),
             re_path(r"^history/$", self.article_history_view, name="history"),
             re_path(r"^settings/$", self.article_settings_view, name="settings"),
             re_path(r"^source/$", self.article_source_view, name="source"),
@@ -202,6 +216,11 @@ class WikiSite:
             re_path(
                 r"^(?P<path>.+/|)_preview/$", self.article_preview_view, name="preview"
             ),
+            re_path(
+                r"^(?P<path>.+/|)_preview/blocks/$",
+                self.article_preview_blocks_view,
+                name="preview_blocks",
+            ),
             re_path(
                 r"^(?P<path>.+/|)_history/$", self.article_history_view, name="history"
             ),
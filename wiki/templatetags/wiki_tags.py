@@ -1,4 +1,5 @@
 import re
+from functools import lru_cache
 from urllib.parse import quote as urlquote
 
 from django import template
@@ -87,6 +88,11 @@ def wiki_messages(context):
     return context
 
 
+@lru_cache(maxsize=128)
+def _get_keyword_re(keyword):
+    return re.compile(r"(\S*%s\S*)" % re.escape(keyword), re.IGNORECASE)
+
+
 # XXX html strong tag is hardcoded
 @register.filter
 def get_content_snippet(content, keyword, max_words=30):
@@ -131,8 +137,7 @@ def get_content_snippet(content, keyword, max_words=30):
         before = " ".join(before_words)
         after = " ".join(after_words)
         html = ("%s %s %s" % (before, striptags(match), after)).strip()
-        kw_p = re.compile(r"(\S*%s\S*)" % keyword, re.IGNORECASE)
-        html = kw_p.sub(r"<strong>\1</strong>", html)
+        html = _get_keyword_re(keyword).sub(r"<strong>\1</strong>", html)
 
         return mark_safe(html)
 
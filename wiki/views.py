@@ -1,5 +1,4 @@
 from django.shortcuts import render
-import markdown
 from wiki.models import Article
 
 
@@ -33,24 +32,7 @@ def md_show(request, title):
         return render(request, 'editor.html')
     # 将markdown语法渲染成html样式
     article = Article.objects.get(id=title)
-    article.content = markdown.markdown(article.content,
-                                        extensions=[
-                                            'markdown.extensions.extra',  # 用于标题、表格、引用这些基本转换
-                                            'markdown.extensions.codehilite',  # 用于语法高亮
-                                            'markdown.extensions.toc',  # 用于生成目录
-                                            'markdown.extensions.abbr',
-                                            'markdown.extensions.attr_list',
-                                            'markdown.extensions.def_list',
-                                            'markdown.extensions.fenced_code',
-                                            'markdown.extensions.footnotes',
-                                            'markdown.extensions.tables',
-                                            'markdown.extensions.admonition',
-                                            'markdown.extensions.meta',
-                                            'markdown.extensions.nl2br',
-                                            'markdown.extensions.sane_lists',
-                                            'markdown.extensions.smarty',
-                                            'markdown.extensions.wikilinks',
-                                        ])
+    article.content = article.render()
     context = {'article': article}
     return render(request, 'example.html', context)
 
@@ -1,9 +1,13 @@
 import difflib
 import logging
-from urllib.parse import urljoin
+import math
+import re
+import time
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.contrib.sites.models import Site
+from django.core.cache import cache
 from django.db import transaction
 from django.db.models import Q
 from django.http import Http404
@@ -20,11 +24,17 @@ from django.views.generic import ListView
 from django.views.generic import RedirectView
 from django.views.generic import TemplateView
 from django.views.generic import View
+from wiki.functions.markdown import article_markdown
 from wiki.functions.markdown import editors
+from wiki.functions.markdown.blocks import get_block_digest
+from wiki.functions.markdown.blocks import get_blocks
+from wiki.functions.markdown.blocks import has_unique_heading_ids
+from wiki.functions.markdown.blocks import render_blocks
 from wiki import forms
 from wiki import models
 from wiki_test import settings
 from wiki.functions import permissions
+from wiki.functions import propagate
 from wiki.functions.diff import simple_merge
 from wiki.functions.exceptions import NoRootURL
 from wiki.functions.paginator import WikiPaginator
@@ -32,6 +42,7 @@ from wiki.functions import registry as plugin_registry
 from wiki.functions.utils import object_to_json_response
 from wiki.decorators import get_article
 from wiki.functions.mixins import ArticleMixin
+from wiki.functions.mixins import CursorPaginationMixin
 
 log = logging.getLogger(__name__)
 
@@ -409,7 +420,6 @@ class Move(ArticleMixin, FormView):
 
     def get_context_data(self, **kwargs):
         kwargs["form"] = self.get_form()
-        kwargs["root_path"] = models.URLPath.root()
         return super().get_context_data(**kwargs)
 
     @transaction.atomic
@@ -424,20 +434,16 @@ class Move(ArticleMixin, FormView):
         dest_path = get_object_or_404(
             models.URLPath, pk=form.cleaned_data["destination"]
         )
-        tmp_path = dest_path
-
-        while tmp_path.parent:
-            if tmp_path == self.urlpath:
-                messages.error(
-                    self.request,
-                    ("这篇文章不能移动到子项目上。"),
-                )
-                return redirect("wiki:move", article_id=self.article.id)
-            tmp_path = tmp_path.parent
+        # Compares the tree fields of both rows, no need to walk the parents
+        if dest_path.is_descendant_of(self.urlpath, include_self=True):
+            messages.error(
+                self.request,
+                ("这篇文章不能移动到子项目上。"),
+            )
+            return redirect("wiki:move", article_id=self.article.id)
 
         # Clear cache to update article lists (Old links)
-        for ancestor in self.article.ancestor_objects():
-            ancestor.article.clear_cache()
+        self.article.clear_ancestor_cache()
 
         # Save the old path for later
         old_path = self.urlpath.path
@@ -450,56 +456,22 @@ class Move(ArticleMixin, FormView):
         self.urlpath = models.URLPath.objects.get(pk=self.urlpath.pk)
 
         # Use a copy of ourself (to avoid cache) and update article links again
-        for ancestor in models.Article.objects.get(
-                pk=self.article.pk
-        ).ancestor_objects():
-            ancestor.article.clear_cache()
+        models.Article.objects.get(pk=self.article.pk).clear_ancestor_cache()
 
-        # Create a redirect page for every moved article
+        # Keep the old paths working
         # /old-slug
         # /old-slug/child
         # /old-slug/child/grand-child
         if form.cleaned_data["redirect"]:
-
-            # NB! Includes self!
-            descendants = list(
-                self.urlpath.get_descendants(include_self=True).order_by("level")
-            )
-
-            root_len = len(descendants[0].path)
-
-            for descendant in descendants:
-                # Without this descendant.get_ancestors() and as a result
-                # descendant.path is wrong after the first create_article() due
-                # to path caching
-                descendant.refresh_from_db()
-                dst_path = descendant.path
-                src_path = urljoin(old_path, dst_path[root_len:])
-                src_len = len(src_path)
-                pos = src_path.rfind("/", 0, src_len - 1)
-                slug = src_path[pos + 1: src_len - 1]
-                parent_urlpath = models.URLPath.get_by_path(src_path[0: max(pos, 0)])
-
-                link = "[wiki:/{path}](wiki:/{path})".format(path=dst_path)
-                urlpath_new = models.URLPath._create_urlpath_from_request(
-                    self.request,
-                    self.article,
-                    parent_urlpath,
-                    slug,
-                    ("Moved: {title}").format(title=descendant.article),
-                    ("Article moved to {link}").format(link=link),
-                    ("Created redirect (auto)"),
-                )
-                urlpath_new.moved_to = descendant
-                urlpath_new.save()
+            redirects = models.URLPathRedirect.create_for_move(self.urlpath, old_path)
 
             messages.success(
                 self.request,
                 ngettext(
                     "文章已成功移动！已创建{n}重定向。",
                     "文章已成功移动！已创建{n}个重定向。",
-                    len(descendants),
-                ).format(n=len(descendants)),
+                    redirects,
+                ).format(n=redirects),
             )
 
         else:
@@ -507,6 +479,80 @@ class Move(ArticleMixin, FormView):
         return redirect("wiki:get", path=self.urlpath.path)
 
 
+class TreeView(View):
+    """
+    Nodes of the URL tree as JSON, for the move dialog to expand on demand.
+    GET parameters: node (id, the root by default) and depth (levels below
+    it, 1 to max_depth).
+    """
+
+    max_depth = 3
+
+    @method_decorator(login_required)
+    def dispatch(self, request, *args, **kwargs):
+        return super().dispatch(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        try:
+            depth = min(max(int(request.GET.get("depth", 1)), 1), self.max_depth)
+        except ValueError:
+            return object_to_json_response({"error": "Invalid depth"}, status=400)
+        node_id = request.GET.get("node")
+        if node_id:
+            node = get_object_or_404(
+                models.URLPath.objects.select_related_common(),
+                pk=node_id,
+                site=Site.objects.get_current(),
+            )
+        else:
+            try:
+                node = models.URLPath.root()
+            except NoRootURL:
+                raise Http404()
+        if not node.article.can_read(request.user):
+            return object_to_json_response({"error": "Permission denied"}, status=403)
+
+        paths = {node.id: node.path}
+        nodes = []
+        # One query for all levels, parents come before their children
+        descendants = (
+            node.get_descendants()
+            .filter(level__lte=node.level + depth)
+            .active()
+            .select_related("article__current_revision")
+            .order_by("level", "slug")
+        )
+        if not permissions.has_custom_read_policy():
+            descendants = descendants.can_read(request.user)
+        for urlpath in permissions.filter_readable(descendants, request.user):
+            if urlpath.parent_id not in paths:
+                # Below a node the user cannot see
+                continue
+            paths[urlpath.id] = "{}{}/".format(paths[urlpath.parent_id], urlpath.slug)
+            nodes.append(
+                {
+                    "id": urlpath.id,
+                    "parent": urlpath.parent_id,
+                    "path": paths[urlpath.id],
+                    "title": urlpath.article.current_revision.title,
+                    "child_count": urlpath.child_count,
+                }
+            )
+        return object_to_json_response(
+            {
+                "node": {
+                    "id": node.id,
+                    "parent": node.parent_id,
+                    "path": paths[node.id],
+                    "title": node.article.current_revision.title,
+                    "child_count": node.child_count,
+                },
+                "depth": depth,
+                "nodes": nodes,
+            }
+        )
+
+
 class Deleted(Delete):
     """
     告诉用户文章已被删除。如果用户具有权限，让用户还原并可能清除已删除的文章和子项。
@@ -584,16 +630,17 @@ class Source(ArticleMixin, TemplateView):
         return super().get_context_data(**kwargs)
 
 
-class History(ListView, ArticleMixin):
+class History(CursorPaginationMixin, ListView, ArticleMixin):
     template_name = "wiki/history.html"
     allow_empty = True
     context_object_name = "revisions"
     paginator_class = WikiPaginator
     paginate_by = 10
+    ordering = ("-created", "-id")
 
     def get_queryset(self):
         return models.ArticleRevision.objects.filter(article=self.article).order_by(
-            "-created"
+            *self.get_ordering()
         )
 
     def get_context_data(self, **kwargs):
@@ -610,13 +657,14 @@ class History(ListView, ArticleMixin):
         return super().dispatch(request, article, *args, **kwargs)
 
 
-class Dir(ListView, ArticleMixin):
+class Dir(CursorPaginationMixin, ListView, ArticleMixin):
     template_name = "wiki/dir.html"
     allow_empty = True
     context_object_name = "directory"
     model = models.URLPath
     paginator_class = WikiPaginator
     paginate_by = 30
+    ordering = ("article__current_revision__title", "id")
 
     @method_decorator(get_article(can_read=True))
     def dispatch(self, request, article, *args, **kwargs):
@@ -628,7 +676,9 @@ class Dir(ListView, ArticleMixin):
         return super().dispatch(request, article, *args, **kwargs)
 
     def get_queryset(self):
-        children = self.urlpath.get_children().can_read(self.request.user)
+        children = self.urlpath.get_children()
+        if not permissions.has_custom_read_policy():
+            children = children.can_read(self.request.user)
         if self.query:
             children = children.filter(
                 Q(article__current_revision__title__icontains=self.query)
@@ -636,9 +686,7 @@ class Dir(ListView, ArticleMixin):
             )
         if not self.article.can_moderate(self.request.user):
             children = children.active()
-        children = children.select_related_common().order_by(
-            "article__current_revision__title"
-        )
+        children = children.select_related_common().order_by(*self.get_ordering())
         return children
 
     def get_context_data(self, **kwargs):
@@ -649,9 +697,12 @@ class Dir(ListView, ArticleMixin):
         kwargs["filter_query"] = self.query
         kwargs["filter_form"] = self.filter_form
 
-        # Update each child's ancestor cache so the lookups don't have
+        # Only the page is checked, the queryset can only apply the built-in
+        # rules. Update each child's ancestor cache so the lookups don't have
         # to be repeated.
-        updated_children = kwargs[self.context_object_name]
+        updated_children = permissions.filter_readable(
+            kwargs[self.context_object_name], self.request.user
+        )
         for child in updated_children:
             child.set_cached_ancestors_from_parent(self.urlpath)
         kwargs[self.context_object_name] = updated_children
@@ -659,11 +710,12 @@ class Dir(ListView, ArticleMixin):
         return kwargs
 
 
-class SearchView(ListView):
+class SearchView(CursorPaginationMixin, ListView):
     template_name = "wiki/search.html"
     paginator_class = WikiPaginator
     paginate_by = 25
     context_object_name = "articles"
+    ordering = ("-current_revision__created", "-id")
 
     def dispatch(self, request, *args, **kwargs):
         self.urlpath = None
@@ -679,8 +731,9 @@ class SearchView(ListView):
 
     def get_queryset(self):
         if not self.query:
-            return models.Article.objects.none().order_by("-current_revision__created")
-        articles = models.Article.objects
+            return models.Article.objects.none().order_by(*self.get_ordering())
+        # The results template shows the current revision's title and text
+        articles = models.Article.objects.select_related("current_revision")
         path = self.kwargs.get("path", None)
         if path:
             try:
@@ -698,11 +751,16 @@ class SearchView(ListView):
         if not permissions.can_moderate(
                 models.URLPath.root().article, self.request.user
         ):
-            articles = articles.active().can_read(self.request.user)
-        return articles.order_by("-current_revision__created")
+            articles = articles.active()
+            if not permissions.has_custom_read_policy():
+                articles = articles.can_read(self.request.user)
+        return articles.order_by(*self.get_ordering())
 
     def get_context_data(self, **kwargs):
         kwargs = super().get_context_data(**kwargs)
+        kwargs[self.context_object_name] = permissions.filter_readable(
+            kwargs[self.context_object_name], self.request.user
+        )
         kwargs["search_form"] = self.search_form
         kwargs["search_query"] = self.query
         kwargs["urlpath"] = self.urlpath
@@ -783,6 +841,7 @@ class Settings(ArticleMixin, TemplateView):
     def get_context_data(self, **kwargs):
         kwargs["selected_tab"] = "settings"
         kwargs["forms"] = self.forms
+        kwargs["propagation"] = propagate.get_progress(self.article.id)
         return super().get_context_data(**kwargs)
 
 
@@ -867,6 +926,116 @@ class Preview(ArticleMixin, TemplateView):
         return ArticleMixin.get_context_data(self, **kwargs)
 
 
+class PreviewBlocks(View):
+
+    """
+    Live preview as JSON. The editor posts its text, an id of its own
+    (editor), a version that grows with every request and the version of
+    the preview it currently shows (base). The answer lists the digests of
+    all blocks in order and the HTML of only those blocks the editor does
+    not have yet.
+
+    Only an API for now, the edit page still previews through Preview.
+    """
+
+    editor_re = re.compile(r"[\w-]{0,40}\Z")
+
+    @method_decorator(get_article(can_write=True, deleted_contents=True))
+    def dispatch(self, request, article, *args, **kwargs):
+        self.article = article
+        kwargs.pop("urlpath", None)
+        return super().dispatch(request, *args, **kwargs)
+
+    def get_client_key(self):
+        # The debounce is per user, or client address for anonymous users.
+        # Nothing the client posts picks the key, so it cannot be sidestepped,
+        # and no session is created just for this.
+        user = self.request.user
+        if user.is_authenticated:
+            client = "user-{}".format(user.pk)
+        else:
+            client = "ip-{}".format(self.request.META.get("REMOTE_ADDR", ""))
+        return "wiki-preview-{}".format(client)
+
+    def get_state_key(self, editor):
+        # Versions are counted per editor, so that two tabs of one user do
+        # not overtake each other
+        return "{client}-{article}-{editor}".format(
+            client=self.get_client_key(), article=self.article.id, editor=editor
+        )
+
+    def post(self, request, *args, **kwargs):
+        try:
+            version = int(request.POST.get("version", ""))
+            base = int(request.POST.get("base", 0))
+        except ValueError:
+            return object_to_json_response({"error": "invalid version"}, status=400)
+        editor = request.POST.get("editor", "")
+        if not self.editor_re.match(editor):
+            return object_to_json_response({"error": "invalid editor"}, status=400)
+        text = request.POST.get("text", "")
+        if len(text) > settings.PREVIEW_MAX_LENGTH:
+            return object_to_json_response({"error": "text too long"}, status=413)
+        blocks = get_blocks(text)
+        if len(blocks) > settings.PREVIEW_MAX_BLOCKS:
+            return object_to_json_response({"error": "too many blocks"}, status=413)
+
+        state_key = self.get_state_key(editor)
+        state = cache.get(state_key) or {"version": 0, "digests": []}
+        if version <= state["version"]:
+            # A request that was overtaken by a newer one
+            return object_to_json_response(
+                {"error": "stale version", "version": state["version"]}, status=409
+            )
+        client_key = self.get_client_key()
+        wait = cache.get(client_key, 0) + settings.PREVIEW_DEBOUNCE - time.time()
+        if wait > 0:
+            response = object_to_json_response(
+                {"error": "too many requests", "retry_after": wait}, status=429
+            )
+            response["Retry-After"] = str(math.ceil(wait))
+            return response
+        # Set before rendering, so that parallel requests are turned away too
+        cache.set(client_key, time.time(), math.ceil(settings.PREVIEW_DEBOUNCE))
+
+        htmls = None
+        if len(blocks) > 1:
+            htmls = render_blocks(
+                blocks,
+                self.article,
+                preview=True,
+                user=request.user,
+                timeout=settings.PREVIEW_CACHE_TIMEOUT,
+            )
+            if not has_unique_heading_ids(htmls):
+                htmls = None
+        if htmls is None:
+            blocks = [text]
+            htmls = [
+                article_markdown(text, self.article, preview=True, user=request.user)
+            ]
+        digests = [get_block_digest(block) for block in blocks]
+
+        # Without the preview it was based on, the editor gets every block
+        known = set(state["digests"]) if base == state["version"] else set()
+        cache.set(
+            state_key,
+            {"version": version, "digests": digests},
+            settings.PREVIEW_CACHE_TIMEOUT,
+        )
+        return object_to_json_response(
+            {
+                "version": version,
+                "order": digests,
+                "blocks": {
+                    digest: html
+                    for digest, html in zip(digests, htmls)
+                    if digest not in known
+                },
+            }
+        )
+
+
 class DiffView(DetailView):
     model = models.ArticleRevision
     pk_url_kwarg = "revision_id"
@@ -0,0 +1,34 @@
+from django.views.generic import View
+from wiki.functions import prerender
+from wiki.functions import stats
+from wiki.functions.utils import object_to_json_response
+
+
+class StatsView(View):
+
+    """Render and cache counters of the serving process, for monitoring."""
+
+    def dispatch(self, request, *args, **kwargs):
+        if not request.user.is_superuser:
+            return object_to_json_response({"error": "forbidden"}, status=403)
+        return super().dispatch(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        return object_to_json_response(self.get_stats())
+
+    def get_stats(self):
+        return {
+            "counters": stats.get_counters(),
+            "hit_rates": {
+                prefix: stats.get_hit_rate(prefix)
+                for prefix in (
+                    "render_cache.shared",
+                    "render_cache.user",
+                    "render_store",
+                    "block_cache",
+                    "codehilite",
+                    "codehilite.shared",
+                )
+            },
+            "prerender": prerender.get_stats(),
+        }
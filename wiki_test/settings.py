@@ -145,6 +145,11 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # 权限设置
 CAN_READ = getattr(django_settings, "WIKI_CAN_READ", None)
 
+#: A callable(articles, user) returning the articles of the list the user
+#: may read, for policies that can check many articles at once. Used by
+#: listings instead of calling CAN_READ per article.
+CAN_READ_BATCH = getattr(django_settings, "WIKI_CAN_READ_BATCH", None)
+
 CAN_WRITE = getattr(django_settings, "WIKI_CAN_WRITE", None)
 
 CAN_ASSIGN = getattr(django_settings, "WIKI_CAN_ASSIGN", None)
@@ -169,6 +174,9 @@ CHECK_SLUG_URL_AVAILABLE = getattr(
     django_settings, "WIKI_CHECK_SLUG_URL_AVAILABLE", True
 )
 
+#: Whether anonymous users may read, and write, articles open to others.
+#: Both are part of the stored article grants, run
+#: ``manage.py wiki_rebuild_grants`` after changing them.
 ANONYMOUS = getattr(django_settings, "WIKI_ANONYMOUS", True)
 
 ANONYMOUS_WRITE = getattr(django_settings, "WIKI_ANONYMOUS_WRITE", False)
@@ -204,18 +212,12 @@ MARKDOWN_SANITIZE_HTML = getattr(django_settings, "WIKI_MARKDOWN_SANITIZE_HTML",
 
 MARKDOWN_KWARGS = {
     "extensions": [
-        "markdown.extensions.footnotes",
-        "markdown.extensions.attr_list",
-        "markdown.extensions.footnotes",
-        "markdown.extensions.attr_list",
-        "markdown.extensions.def_list",
-        "markdown.extensions.tables",
-        "markdown.extensions.abbr",
         "markdown.extensions.sane_lists",
+        # Also loads abbr, attr_list, def_list, fenced_code, footnotes,
+        # md_in_html and tables
         "markdown.extensions.extra",
         "markdown.extensions.codehilite",
         "markdown.extensions.toc",
-        "markdown.extensions.fenced_code",
         "markdown.extensions.admonition",
         "markdown.extensions.meta",
         "markdown.extensions.nl2br",
@@ -297,6 +299,59 @@ LOG_IPS_USERS = getattr(django_settings, "WIKI_LOG_IPS_USERS", False)
 
 CACHE_TIMEOUT = getattr(django_settings, "WIKI_CACHE_TIMEOUT", 600)
 
+#: When an article is not cached, only one request renders it. The others
+#: serve the previously rendered version if there is one, or wait up to
+#: RENDER_LOCK_WAIT seconds for the new one. RENDER_LOCK_TIMEOUT releases the
+#: lock of a renderer that died.
+RENDER_LOCK_TIMEOUT = getattr(django_settings, "WIKI_RENDER_LOCK_TIMEOUT", 30)
+
+RENDER_LOCK_WAIT = getattr(django_settings, "WIKI_RENDER_LOCK_WAIT", 2)
+
+#: Keep rendered HTML of each revision in the database, so that it survives
+#: cache evictions and restarts. Run ``manage.py wiki_clear_renders`` after
+#: changing plugins or markdown settings.
+RENDER_STORE = getattr(django_settings, "WIKI_RENDER_STORE", True)
+
+#: Render new revisions on a background thread pool right after they are
+#: saved. Set to False to render on first view instead, or to run
+#: ``manage.py wiki_prerender --loop`` as a separate worker.
+PRERENDER = getattr(django_settings, "WIKI_PRERENDER", True)
+
+PRERENDER_WORKERS = getattr(django_settings, "WIKI_PRERENDER_WORKERS", 2)
+
+#: Articles with at least this many characters are rendered section by
+#: section, caching each section's HTML, so an edit only renders the sections
+#: it changed. None renders every article in one piece.
+BLOCK_CACHE_MIN_LENGTH = getattr(django_settings, "WIKI_BLOCK_CACHE_MIN_LENGTH", 20000)
+
+#: Highlighted code blocks are kept in a per-process LRU of this many
+#: entries, so code that did not change skips Pygments. 0 turns it off.
+CODEHILITE_CACHE_SIZE = getattr(django_settings, "WIKI_CODEHILITE_CACHE_SIZE", 500)
+
+#: Share highlighted code blocks between processes through the Django cache
+#: as a second tier behind the per-process LRU.
+CODEHILITE_SHARED_CACHE = getattr(django_settings, "WIKI_CODEHILITE_SHARED_CACHE", False)
+
+#: Minimum number of seconds between two live previews of one user, or one
+#: client address for anonymous users. Earlier requests are answered with
+#: HTTP 429.
+PREVIEW_DEBOUNCE = getattr(django_settings, "WIKI_PREVIEW_DEBOUNCE", 0.5)
+
+#: Most characters and blocks a live preview renders. Longer texts are
+#: answered with HTTP 413.
+PREVIEW_MAX_LENGTH = getattr(django_settings, "WIKI_PREVIEW_MAX_LENGTH", 200000)
+
+PREVIEW_MAX_BLOCKS = getattr(django_settings, "WIKI_PREVIEW_MAX_BLOCKS", 100)
+
+#: Seconds the HTML of live preview blocks stays in the cache. Unsaved text
+#: is rarely shown again, so it should not push articles out for long.
+PREVIEW_CACHE_TIMEOUT = getattr(django_settings, "WIKI_PREVIEW_CACHE_TIMEOUT", 60)
+
+#: Keep an in-memory copy of the URL tree in every process, to resolve paths
+#: without a query per level. Changes reach other processes through the
+#: cache, so it must be shared between them.
+TREE_SNAPSHOT = getattr(django_settings, "WIKI_TREE_SNAPSHOT", True)
+
 MESSAGE_TAG_CSS_CLASS = getattr(
     django_settings,
     "WIKI_MESSAGE_TAG_CSS_CLASS",
@@ -332,6 +387,20 @@ URL_CASE_SENSITIVE = getattr(django_settings, "WIKI_URL_CASE_SENSITIVE", False)
 
 SHOW_MAX_CHILDREN = getattr(django_settings, "WIKI_SHOW_MAX_CHILDREN", 20)
 
+#: Apply recursive permission, group and owner changes to subtrees of more
+#: than this many articles on a background thread, after the settings form
+#: has been saved. None always applies them inside the request.
+PROPAGATE_BACKGROUND_MIN = getattr(django_settings, "WIKI_PROPAGATE_BACKGROUND_MIN", 2000)
+
+#: Page History, Dir and Search with "next" and "previous" links that carry
+#: the position (a cursor) instead of page numbers, so deep pages don't scan
+#: all rows before them.
+PAGINATION_CURSOR = getattr(django_settings, "WIKI_PAGINATION_CURSOR", False)
+
+#: With PAGINATION_CURSOR, totals stop counting at this many rows and are
+#: shown as "more than". None counts everything.
+PAGINATION_COUNT_LIMIT = getattr(django_settings, "WIKI_PAGINATION_COUNT_LIMIT", 1000)
+
 SIMPLEUI_CONFIG = {
     # 是否使用系统默认菜单，自定义菜单时建议关闭。
     'system_keep': False,
@@ -7,6 +7,7 @@ from wiki.functions import registry
 from wiki.views import accounts
 from wiki.views import article
 from wiki.views import deleted_list
+from wiki.views import stats
 from django.contrib import admin
 
 urlpatterns = [
@@ -35,6 +36,7 @@ class WikiURLPatterns:
     article_edit_view_class = article.Edit
     article_move_view_class = article.Move
     article_preview_view_class = article.Preview
+    article_preview_blocks_view_class = article.PreviewBlocks
     article_history_view_class = article.History
     article_settings_view_class = article.Settings
     article_source_view_class = article.Source
@@ -43,6 +45,7 @@ class WikiURLPatterns:
     revision_merge_view_class = article.MergeView
 
     search_view_class = article.SearchView
+    tree_view_class = article.TreeView
     article_diff_view_class = article.DiffView
 
     # account views
@@ -54,6 +57,9 @@ class WikiURLPatterns:
     # deleted list view
     deleted_list_view_class = deleted_list.DeletedListView
 
+    # monitoring
+    stats_view_class = stats.StatsView
+
     def get_urls(self):
         urlpatterns = self.get_root_urls()
         urlpatterns += self.get_accounts_urls()
@@ -85,6 +91,7 @@ class WikiURLPatterns:
                 name="root_missing",
             ),
             re_path(r"^_search/$", self.search_view_class.as_view(), name="search"),
+            re_path(r"^_tree/$", self.tree_view_class.as_view(), name="tree"),
             re_path(
                 r"^_revision/diff/(?P<revision_id>[0-9]+)/$",
                 self.article_diff_view_class.as_view(),
@@ -98,6 +105,9 @@ class WikiURLPatterns:
             re_path(
                 "^_admin/$", self.deleted_list_view_class.as_view(), name="deleted_list"
             ),
+            re_path(
+                "^_admin/stats/$", self.stats_view_class.as_view(), name="stats"
+            ),
         ]
         return urlpatterns
 
@@ -182,6 +192,11 @@ class WikiURLPatterns:
                 self.article_preview_view_class.as_view(),
                 name="preview",
             ),
+            re_path(
+                r"^(?P<article_id>[0-9]+)/preview/blocks/$",
+                self.article_preview_blocks_view_class.as_view(),
+                name="preview_blocks",
+            ),
             re_path(
                 r"^(?P<article_id>[0-9]+)/history/$",
                 self.article_history_view_class.as_view(),
@@ -248,6 +263,11 @@ class WikiURLPatterns:
                 self.article_preview_view_class.as_view(),
                 name="preview",
             ),
+            re_path(
+                r"^(?P<path>.+/|)_preview/blocks/$",
+                self.article_preview_blocks_view_class.as_view(),
+                name="preview_blocks",
+            ),
             re_path(
                 r"^(?P<path>.+/|)_history/$",
                 self.article_history_view_class.as_view(),